@@ -2,7 +2,9 @@ import streamlit as st
 from datetime import date, timedelta
 
 from utils.classify import ALL_SEGMENTS, STORE_LOCATIONS
-from utils.gsc import fetch_gsc_data
+from utils.cube import cached_cube, cube_token, filter_frame
+from utils.gsc import fetch_gsc_data, fetch_gsc_ranges
+from utils.telemetry import timer
 from views import overview, winners_losers, new_lost, categories, page_performance, query_explorer, admin
 
 st.set_page_config(
@@ -637,15 +639,14 @@ if compare_option == "Previous Period":
 else:  # Same Period Last Year
     prev_start = start - timedelta(days=365)
     prev_end = end - timedelta(days=365)
+prev_start_str = prev_start.strftime("%Y-%m-%d")
+prev_end_str = prev_end.strftime("%Y-%m-%d")
 
 # ── LOAD DATA ────────────────────────────────────────────────
 with st.spinner(""):
     try:
-        df = fetch_gsc_data(start_str, end_str)
-        df_prev = fetch_gsc_data(
-            prev_start.strftime("%Y-%m-%d"),
-            prev_end.strftime("%Y-%m-%d")
-        )
+        with timer("app.load_data"):
+            df, df_prev = fetch_gsc_ranges((start_str, end_str), (prev_start_str, prev_end_str))
     except Exception as e:
         st.error(f"Data loading error: {e}")
         import pandas as pd
@@ -657,33 +658,31 @@ if df.empty:
     st.stop()
 
 # ── APPLY FILTERS ────────────────────────────────────────────
-df_filtered = df[df["segment"].isin(segment_filter)].copy()
-df_prev_filtered = df_prev[df_prev["segment"].isin(segment_filter)].copy()
-
-if store_filter != "All Stores":
-    df_filtered = df_filtered[df_filtered["store"] == store_filter]
-    df_prev_filtered = df_prev_filtered[df_prev_filtered["store"] == store_filter]
-
-df_filtered = df_filtered[~df_filtered["segment"].isin(["Noise", "Not Relevant"])]
-df_prev_filtered = df_prev_filtered[~df_prev_filtered["segment"].isin(["Noise", "Not Relevant"])]
+# Filtering and aggregation only run when the dataset or filter state changes;
+# every other rerun is a cache lookup on the token.
+filter_state = (tuple(segment_filter), store_filter)
+cube = cached_cube(cube_token(df.attrs.get("version"), *filter_state), lambda: filter_frame(df, *filter_state))
+cube_prev = cached_cube(cube_token(df_prev.attrs.get("version"), *filter_state), lambda: filter_frame(df_prev, *filter_state))
 
 # ── PAGE CONTENT ─────────────────────────────────────────────
 st.markdown('<div class="page-content">', unsafe_allow_html=True)
 
 page = st.session_state.page
 
-if page == "Overview":
-    overview.render(df_filtered, df_prev_filtered, start_str, end_str, period_days, compare_option)
-elif page == "Winners & Losers":
-    winners_losers.render(df_filtered, df_prev_filtered, start_str, end_str, period_days)
-elif page == "New & Lost":
-    new_lost.render(df_filtered, df_prev_filtered, start_str, end_str, period_days)
-elif page == "Categories":
-    categories.render(df_filtered, df_prev_filtered, start_str, end_str, period_days)
-elif page == "Page Performance":
-    page_performance.render(df_filtered, df_prev_filtered, start_str, end_str, period_days)
-elif page == "Query Explorer":
-    query_explorer.render(df_filtered, start_str, end_str)
+# Everything a page does after the cubes are built: memoised lookups, tables and charts.
+with timer(f"render.{page}"):
+    if page == "Overview":
+        overview.render(cube, cube_prev, start_str, end_str, period_days, compare_option)
+    elif page == "Winners & Losers":
+        winners_losers.render(cube, cube_prev, start_str, end_str, period_days)
+    elif page == "New & Lost":
+        new_lost.render(cube, cube_prev, start_str, end_str, period_days, prev_start_str, prev_end_str)
+    elif page == "Categories":
+        categories.render(cube, cube_prev, start_str, end_str, period_days)
+    elif page == "Page Performance":
+        page_performance.render(cube, cube_prev, start_str, end_str, period_days)
+    elif page == "Query Explorer":
+        query_explorer.render(cube, start_str, end_str)
 
 st.markdown('</div>', unsafe_allow_html=True)
 
@@ -0,0 +1,28 @@
+import streamlit.config
+import streamlit.logger
+import streamlit.runtime.caching
+
+
+def quiet_streamlit():
+    """Silence bare-mode Streamlit's warnings about running without a script context.
+
+    Its loggers are its own, so the level goes through streamlit.logger, which also applies
+    it to loggers created later. Parsing the config resets the level to logger.level, so it
+    is parsed here, quietly, rather than on AppTest's first run, and the level set again.
+    """
+    streamlit.logger.set_log_level("ERROR")
+    streamlit.config.get_config_options()
+    streamlit.logger.set_log_level("ERROR")
+
+
+# The cache decorators already warn while utils and views are being imported, before any
+# benchmark's main() runs, so this has to happen as soon as the package is imported.
+quiet_streamlit()
+
+from utils import gsc
+
+
+def prepare_offline_run():
+    """Lift the API quota for a run against the fake backend."""
+    # The API quota is not what's being measured; let the fake answer as fast as it can.
+    gsc.GSC_QPS = gsc.GSC_BURST = 1_000_000
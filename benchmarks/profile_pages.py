@@ -0,0 +1,257 @@
+"""Headless profile of every dashboard page, driven through Streamlit's AppTest.
+
+Runs app.py against the fake backend, clicks through every nav page under every Period
+and both Compare options, and records wall time, CPU time and allocations per rerun:
+
+    python -m benchmarks.profile_pages
+    python -m benchmarks.profile_pages --periods "Last 30 days,Last 12 months" --rows-per-day 5000
+
+Writes two files to --output-dir:
+
+    pages.json    one entry per rerun, plus per-page totals
+    pages.folded  collapsed stacks ("frame;frame;frame count"), one tower per
+                  page / period / compare, for flamegraph.pl, speedscope or inferno
+
+Stacks come from sampling every thread every --interval seconds, so fetch work on the
+worker pool is attributed to the page that triggered it. Idle waits are left out.
+Allocation tracking slows the run down; pass --no-allocations for cleaner timings.
+Exits non-zero if any rerun raised or showed an st.error, such as a failed fetch.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks import prepare_offline_run
+from utils import warehouse
+from utils.backends import FakeBackend, use_backend
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+# Must match the Period and Compare with selectboxes and NAV_PAGES in app.py.
+PERIODS = [
+    "Last 7 days", "Last 2 weeks", "Last 30 days",
+    "Last 3 months", "Last 6 months", "Last 12 months", "Custom"
+]
+COMPARES = ["Previous Period", "Same Period Last Year"]
+NAV_PAGES = [
+    "Overview", "Winners & Losers", "New & Lost",
+    "Categories", "Page Performance", "Query Explorer"
+]
+
+DEFAULT_OUTPUT_DIR = os.path.join("benchmarks", "profiles")
+TIMEOUT_SECONDS = 600
+
+
+def _frame_name(code):
+    path = code.co_filename
+    if path.startswith(ROOT):
+        path = os.path.relpath(path, ROOT)
+    else:
+        path = os.path.basename(path)
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({path})"
+
+
+def _is_idle(frame):
+    """A thread parked on a lock, event or empty work queue."""
+    path = frame.f_code.co_filename
+    return (
+        path.endswith(("threading.py", "queue.py", "selectors.py"))
+        or (frame.f_code.co_name == "_worker" and path.endswith(os.path.join("futures", "thread.py")))
+    )
+
+
+class StackSampler:
+    """Samples every other thread's Python stack into collapsed-stack counts.
+
+    Each sample is prefixed with the current `label`, so one profile holds a separate
+    tower per step; nothing is recorded while the label is None.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = Counter()
+        self.label = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        skip = {threading.get_ident(), threading.main_thread().ident}
+        while not self.stopped.wait(self.interval):
+            label = self.label
+            if label is None:
+                continue
+            for ident, frame in sys._current_frames().items():
+                if ident in skip or _is_idle(frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    # Every thread starts in threading.py; those frames are the same everywhere.
+                    if not frame.f_code.co_filename.endswith("threading.py"):
+                        stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(label)
+                self.counts[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+def _selectbox(at, label):
+    return next(box for box in at.selectbox if box.label == label)
+
+
+class PageProfiler:
+    """Drives one AppTest session and records a step for every rerun it triggers."""
+
+    def __init__(self, sampler, allocations=True):
+        self.sampler = sampler
+        self.allocations = allocations
+        self.steps = []
+        self.at = AppTest.from_file(APP, default_timeout=TIMEOUT_SECONDS)
+        self.at.secrets["auth"] = {"password": "profile"}
+        self.at.session_state["authenticated"] = True
+        self.at.session_state["loaded"] = True
+
+    def step(self, action, page, period, compare, trigger):
+        self.sampler.label = f"{page} | {period} | {compare}"
+        if self.allocations:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        trigger()
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        self.sampler.label = None
+
+        step = {
+            "page": page,
+            "period": period,
+            "compare": compare,
+            "action": action,
+            "wall_seconds": wall,
+            "cpu_seconds": cpu,
+        }
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            step["alloc_peak_bytes"] = peak - before
+            step["alloc_retained_bytes"] = current - before
+        # A failed fetch shows st.error and stops the script, which looks like a very fast
+        # clean rerun; count it as a failure like an uncaught exception.
+        errors = [e.value for e in self.at.exception] + [e.value for e in self.at.error]
+        if errors:
+            step["error"] = errors
+        self.steps.append(step)
+        print(f"{step['page']:<18} {period:<16} {compare:<22} {action:<8} "
+              f"{wall:8.3f}s wall {cpu:8.3f}s cpu" + ("  ERROR" if "error" in step else ""))
+        return step
+
+    def run(self, periods, compares):
+        self.step("load", "Overview", "Last 3 months", "Previous Period", self.at.run)
+        for compare in compares:
+            for period in periods:
+                def choose(period=period, compare=compare):
+                    _selectbox(self.at, "Period").select(period)
+                    _selectbox(self.at, "Compare with").select(compare)
+                    self.at.run()
+                self.step("filters", self.at.session_state["page"], period, compare, choose)
+                for page in NAV_PAGES:
+                    if page == self.at.session_state["page"]:
+                        continue
+                    self.step("nav", page, period, compare,
+                              lambda page=page: self.at.button(key=f"nav_{page}").click().run())
+
+
+def summarize(steps):
+    """Per-page totals, slowest first."""
+    pages = {}
+    for step in steps:
+        page = pages.setdefault(step["page"], {"page": step["page"], "renders": 0,
+                                               "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                               "max_wall_seconds": 0.0, "max_alloc_peak_bytes": 0})
+        page["renders"] += 1
+        page["wall_seconds"] += step["wall_seconds"]
+        page["cpu_seconds"] += step["cpu_seconds"]
+        page["max_wall_seconds"] = max(page["max_wall_seconds"], step["wall_seconds"])
+        page["max_alloc_peak_bytes"] = max(page["max_alloc_peak_bytes"], step.get("alloc_peak_bytes", 0))
+    for page in pages.values():
+        page["mean_wall_seconds"] = page["wall_seconds"] / page["renders"]
+    return sorted(pages.values(), key=lambda page: page["wall_seconds"], reverse=True)
+
+
+def _choices(value, allowed, name, parser):
+    chosen = [item.strip() for item in value.split(",") if item.strip()]
+    unknown = [item for item in chosen if item not in allowed]
+    if unknown:
+        parser.error(f"unknown {name}: {', '.join(unknown)}")
+    return chosen
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--periods", default=",".join(PERIODS), help="comma-separated Period options")
+    parser.add_argument("--compares", default=",".join(COMPARES), help="comma-separated Compare with options")
+    parser.add_argument("--rows-per-day", type=int, default=2_000, help="size of the generated dataset")
+    parser.add_argument("--interval", type=float, default=0.005, help="stack sampling interval in seconds")
+    parser.add_argument("--no-allocations", dest="allocations", action="store_false",
+                        help="skip tracemalloc, which inflates wall and CPU time")
+    parser.add_argument("--warehouse", help="warehouse directory to reuse; a fresh one by default")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    args = parser.parse_args(argv)
+    periods = _choices(args.periods, PERIODS, "periods", parser)
+    compares = _choices(args.compares, COMPARES, "compare options", parser)
+
+    prepare_offline_run()
+    use_backend(FakeBackend(rows_per_day=args.rows_per_day))
+    warehouse.WAREHOUSE_DIR = args.warehouse or tempfile.mkdtemp(prefix="gsc-profile-")
+
+    sampler = StackSampler(args.interval)
+    profiler = PageProfiler(sampler, args.allocations)
+    if args.allocations:
+        tracemalloc.start()
+    sampler.start()
+    try:
+        profiler.run(periods, compares)
+    finally:
+        sampler.stop()
+        if args.allocations:
+            tracemalloc.stop()
+        use_backend(None)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    report = {
+        "rows_per_day": args.rows_per_day,
+        "allocations": args.allocations,
+        "pages": summarize(profiler.steps),
+        "steps": profiler.steps,
+    }
+    with open(os.path.join(args.output_dir, "pages.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    sampler.write(os.path.join(args.output_dir, "pages.folded"))
+
+    print()
+    for page in report["pages"]:
+        print(f"{page['page']:<18} {page['renders']:3d} renders  {page['wall_seconds']:8.2f}s wall  "
+              f"mean {page['mean_wall_seconds']:6.3f}s  max {page['max_wall_seconds']:6.3f}s")
+    print(f"Wrote {args.output_dir}/pages.json and pages.folded")
+    return 1 if any("error" in step for step in profiler.steps) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+"""Benchmarks for the data path: fetch, classification, filtering and each view's computations.
+
+Runs offline against the fake backend and writes one JSON report:
+
+    python -m benchmarks.run                                   # 10k, 100k, 1M and 5M rows
+    python -m benchmarks.run --sizes 10k,100k --repeat 5
+    python -m benchmarks.run --output new.json --baseline old.json
+
+A size is the row count of the fetched current + previous periods together. Every
+benchmark is timed `--repeat` times, reporting the best run, then run once more under
+tracemalloc for its peak allocation (NumPy and pandas buffers included).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from benchmarks import prepare_offline_run
+from utils import gsc, warehouse
+from utils.backends import FakeBackend, use_backend
+from utils.classify import ALL_SEGMENTS, STORE_ORDER, auto_classify, classify_query
+from utils.cube import Cube, cube_token, filter_frame
+from utils.sheets import load_classifications
+from views import categories, new_lost, overview, page_performance, query_explorer, winners_losers
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "5M": 5_000_000}
+
+# Fixed dates, so every run generates the same rows whatever day it is.
+PERIOD_DAYS = 28
+END = date(2025, 6, 29)
+CURRENT = ((END - timedelta(days=PERIOD_DAYS - 1)).isoformat(), END.isoformat())
+PREVIOUS = (
+    (END - timedelta(days=2 * PERIOD_DAYS - 1)).isoformat(),
+    (END - timedelta(days=PERIOD_DAYS)).isoformat(),
+)
+
+# The sidebar's default selection.
+DEFAULT_SEGMENTS = tuple(s for s in ALL_SEGMENTS if s not in ["Other", "Noise", "Not Relevant"])
+
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results.json")
+
+
+def backend_for(rows):
+    """A fake property whose two periods hold about `rows` rows, with a vocabulary to match."""
+    return FakeBackend(
+        rows_per_day=max(1, rows // (2 * PERIOD_DAYS)),
+        queries=min(max(2_000, rows // 10), 300_000),
+        pages=min(max(200, rows // 500), 20_000),
+    )
+
+
+def clear_caches():
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def measure(name, fn, setup=None, repeat=3, items=None):
+    """Best-of-`repeat` wall time plus CPU time, then one more run under tracemalloc."""
+    runs, cpu = [], []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        fn()
+        runs.append(time.perf_counter() - wall_start)
+        cpu.append(time.process_time() - cpu_start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    best = min(runs)
+    result = {
+        "name": name,
+        "seconds": best,
+        "cpu_seconds": cpu[runs.index(best)],
+        "runs": runs,
+        "peak_bytes": peak,
+    }
+    if items:
+        result["items"] = items
+        result["items_per_second"] = items / best if best else None
+    return result
+
+
+def view_benchmarks(cube, cube_prev):
+    """(name, fn, cached helpers) for the computations behind each views/*.render."""
+    def overview_compute():
+        overview.performance_series(cube.token, "Week", cube)
+        edges = tuple((low, high) for _, _, low, high in overview.BUCKETS)
+        overview.keyword_distribution(cube.token, cube_prev.token, edges, cube, cube_prev)
+        overview.segment_clicks(cube.token, cube_prev.token, cube, cube_prev)
+
+    def new_lost_compute():
+        new_lost.new_and_lost(cube.token, cube_prev.token, CURRENT, PREVIOUS, cube, cube_prev)
+
+    selected = tuple(sorted(["Brand (Pure)", "Brand + Location"]))
+
+    def categories_compute():
+        categories.category_series(cube.token, selected, "Week", cube)
+        categories.top_queries(cube.token, selected, cube)
+        categories.store_breakdown(cube.token, selected, cube)
+
+    def page_performance_compute():
+        page_performance.labelled_pages(cube.token, cube)
+        page_performance.labelled_pages(cube_prev.token, cube_prev)
+        pages = page_performance.top_pages(cube.token, cube_prev.token, "All", cube, cube_prev)
+        if not pages.empty:
+            slug = pages["URL"].iloc[0]
+            page_performance.page_trend(cube.token, slug, "Week", cube)
+            page_performance.top_page_queries(cube.token, slug, cube)
+
+    return [
+        ("view.overview", overview_compute, [
+            overview.performance_series, overview.keyword_distribution, overview.segment_clicks,
+        ]),
+        ("view.winners_losers", lambda: winners_losers.compare_queries(
+            cube.token, cube_prev.token, cube, cube_prev
+        ), [winners_losers.compare_queries]),
+        ("view.new_lost", new_lost_compute, [new_lost.new_and_lost, gsc._query_activity]),
+        ("view.categories", categories_compute, [
+            categories.category_series, categories.top_queries, categories.store_breakdown,
+        ]),
+        ("view.page_performance", page_performance_compute, [
+            page_performance.labelled_pages, page_performance.top_pages, page_performance.page_trend,
+            page_performance.top_page_queries, page_performance.classify_page, page_performance.to_slug,
+        ]),
+        ("view.query_explorer", lambda: query_explorer.explorer_table(cube.token, cube), [
+            query_explorer.explorer_table,
+        ]),
+    ]
+
+
+def run_size(label, rows, repeat, workdir):
+    """Every benchmark for one dataset size, cold first so later steps reuse its output."""
+    backend = backend_for(rows)
+    use_backend(backend)
+    warehouse.WAREHOUSE_DIR = os.path.join(workdir, label)
+    results = []
+    frames = {}
+
+    def reset_warehouse():
+        shutil.rmtree(warehouse.WAREHOUSE_DIR, ignore_errors=True)
+        clear_caches()
+
+    def fetch():
+        df, df_prev = gsc.fetch_gsc_ranges(CURRENT, PREVIOUS)
+        if df.empty or df_prev.empty:
+            raise RuntimeError(f"fetch returned no rows for {label}")
+        frames["df"], frames["df_prev"] = df, df_prev
+
+    results.append(measure("fetch.cold", fetch, reset_warehouse, repeat=1))
+    results.append(measure("fetch.warm", fetch, clear_caches, repeat))
+    results.append(measure("fetch.cached", fetch, repeat=repeat))
+    df, df_prev = frames["df"], frames["df_prev"]
+    total = len(df) + len(df_prev)
+    results[-3]["items"] = results[-2]["items"] = results[-1]["items"] = total
+
+    queries = df["query"].cat.categories.tolist()
+    manual = load_classifications()
+    results.append(measure(
+        "classify", lambda: [classify_query(query, manual) for query in queries],
+        auto_classify.cache_clear, repeat, items=len(queries)
+    ))
+
+    results.append(measure(
+        "filter.segments",
+        lambda: (filter_frame(df, DEFAULT_SEGMENTS), filter_frame(df_prev, DEFAULT_SEGMENTS)),
+        repeat=repeat, items=total
+    ))
+    results.append(measure(
+        "filter.store",
+        lambda: (filter_frame(df, DEFAULT_SEGMENTS, STORE_ORDER[0]),
+                 filter_frame(df_prev, DEFAULT_SEGMENTS, STORE_ORDER[0])),
+        repeat=repeat, items=total
+    ))
+
+    filtered = filter_frame(df, DEFAULT_SEGMENTS)
+    filtered_prev = filter_frame(df_prev, DEFAULT_SEGMENTS)
+    tokens = (
+        cube_token(df.attrs.get("version"), DEFAULT_SEGMENTS, "All Stores"),
+        cube_token(df_prev.attrs.get("version"), DEFAULT_SEGMENTS, "All Stores"),
+    )
+    cubes = {}
+
+    def build_cubes():
+        cubes["cube"] = Cube(filtered, tokens[0])
+        cubes["cube_prev"] = Cube(filtered_prev, tokens[1])
+
+    results.append(measure("cube.build", build_cubes, repeat=repeat, items=len(filtered) + len(filtered_prev)))
+
+    for name, fn, helpers in view_benchmarks(cubes["cube"], cubes["cube_prev"]):
+        def clear(helpers=helpers):
+            for helper in helpers:
+                getattr(helper, "cache_clear", getattr(helper, "clear", None))()
+        results.append(measure(name, fn, clear, repeat))
+
+    use_backend(None)
+    return {
+        "size": label,
+        "rows": total,
+        "queries": len(queries),
+        "pages": len(df["page"].cat.categories),
+        "max_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "benchmarks": results,
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "streamlit": st.__version__,
+    }
+
+
+def compare(report, baseline):
+    """Print each benchmark's best time against the same size and name in `baseline`."""
+    before = {
+        (size["size"], bench["name"]): bench["seconds"]
+        for size in baseline.get("sizes", []) for bench in size["benchmarks"]
+    }
+    for size in report["sizes"]:
+        for bench in size["benchmarks"]:
+            old = before.get((size["size"], bench["name"]))
+            if old:
+                print(f"{size['size']:>5} {bench['name']:<24} {old:9.4f}s -> {bench['seconds']:9.4f}s "
+                      f"({bench['seconds'] / old - 1:+.1%})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(SIZES),
+                        help=f"comma-separated subset of {', '.join(SIZES)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the JSON report")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args(argv)
+
+    labels = [label.strip() for label in args.sizes.split(",") if label.strip()]
+    unknown = [label for label in labels if label not in SIZES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+
+    prepare_offline_run()
+
+    report = {"environment": environment(), "repeat": args.repeat, "sizes": []}
+    workdir = tempfile.mkdtemp(prefix="gsc-bench-")
+    try:
+        for label in labels:
+            size = run_size(label, SIZES[label], args.repeat, workdir)
+            report["sizes"].append(size)
+            for bench in size["benchmarks"]:
+                print(f"{label:>5} {bench['name']:<24} {bench['seconds']:9.4f}s "
+                      f"peak {bench['peak_bytes'] / 2**20:8.1f} MiB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+
+from utils.classify import (
+    BRAND_PURE_TERMS, GENERIC_SHOP_TERMS, NEAR_ME_TERMS, NOISE_TERMS, ONLINE_TERMS,
+    STORE_LOCATIONS, auto_classify, classify_query
+)
+from utils.matcher import AhoCorasick
+
+
+def scan_classify(query):
+    """The term-list scan auto_classify replaced, kept as the reference."""
+    q = query.lower().strip()
+
+    if any(n in q for n in NOISE_TERMS):
+        if not any(b in q for b in BRAND_PURE_TERMS):
+            return "Noise", None
+
+    is_brand = any(b in q for b in BRAND_PURE_TERMS)
+
+    for store, terms in STORE_LOCATIONS.items():
+        for term in terms:
+            if term in q:
+                if store == "A63 / Hull Brough" and "middlesbrough" in q:
+                    continue
+                if store == "Hull" and "solihull" in q:
+                    continue
+                if is_brand:
+                    return "Brand + Location", store
+                else:
+                    return "Store & Local", store
+
+    if is_brand:
+        return "Brand (Pure)", None
+
+    if any(t in q for t in NEAR_ME_TERMS):
+        return "Store Intent (Near Me)", None
+
+    if any(t in q for t in ONLINE_TERMS):
+        return "Online / National", None
+
+    if "sex shop" in q or "sex shops" in q or "adult shop" in q or "adult store" in q:
+        return "Generic Sex Shop", None
+
+    return "Other", None
+
+
+def test_matcher_finds_overlapping_patterns():
+    matcher = AhoCorasick({"he": {"he"}, "she": {"she"}, "his": {"his"}, "hers": {"hers"}})
+    assert matcher.labels("ushers") == {"he", "she", "hers"}
+    assert matcher.labels("this") == {"his"}
+    assert matcher.labels("") == set()
+
+
+def test_matcher_follows_failure_links():
+    # "abcd" fails part-way through, and "bc" and "c" have to be picked up from the fallback.
+    matcher = AhoCorasick({"abcd": {1}, "bc": {2}, "c": {3}, "bcx": {4}})
+    assert matcher.labels("abcx") == {2, 3, 4}
+    assert matcher.labels("abcd") == {1, 2, 3}
+
+
+def test_matcher_merges_labels_of_shared_patterns():
+    matcher = AhoCorasick({"hull": {"hull", "city"}, "solihull": {"exclude"}})
+    assert matcher.labels("solihull") == {"hull", "city", "exclude"}
+
+
+@pytest.mark.parametrize("query", [
+    "pulse and cocktail hull",
+    "pulse and cocktail solihull",
+    "sex shop middlesbrough",
+    "middlesbrough a63 brough",
+    "pulse gym leeds",
+    "pulse and cocktail pulse gym",
+    "PULSE & COCKTAIL near me",
+    "  adult store online  ",
+    "sex shops uk",
+    "blaydon pulse rate",
+    "something else entirely",
+    "",
+])
+def test_auto_classify_matches_term_scan(query):
+    assert auto_classify(query) == scan_classify(query)
+
+
+def test_auto_classify_matches_term_scan_on_random_queries():
+    terms = (
+        NOISE_TERMS + BRAND_PURE_TERMS + NEAR_ME_TERMS + ONLINE_TERMS + GENERIC_SHOP_TERMS
+        + [term for store_terms in STORE_LOCATIONS.values() for term in store_terms]
+        + ["middlesbrough", "solihull", "vibrator", "lube", "opening times", "x", "Pulse", "HULL"]
+    )
+    rng = random.Random(0)
+    for _ in range(20_000):
+        parts = rng.sample(terms, rng.randint(1, 4))
+        query = rng.choice(["", " "]).join(parts)
+        assert auto_classify(query) == scan_classify(query), query
+
+
+def test_manual_classification_wins():
+    manual = {"pulse and cocktail leeds": ("Product", None)}
+    assert classify_query("pulse and cocktail leeds", manual) == ("Product", None)
+    assert classify_query("pulse and cocktail hull", manual) == ("Brand + Location", "Hull")
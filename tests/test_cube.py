@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+from utils.classify import SEGMENT_CATEGORIES, STORE_ORDER
+from utils.cube import MEASURES, Cube, aggregate, filter_frame, period_rollup, rollup
+from views import categories, overview, winners_losers
+
+
+def frame():
+    """A small frame with the dtypes fetch_gsc_ranges produces."""
+    return pd.DataFrame({
+        "query": pd.Categorical(["sex shop leeds", "lube", "pulse and cocktail"]),
+        "date": pd.to_datetime(["2025-05-01", "2025-05-02", "2025-05-09"]),
+        "page": pd.Categorical(["/leeds", "/lube", "/"]),
+        "clicks": np.array([3, 1, 7], dtype=np.int32),
+        "impressions": np.array([30, 20, 40], dtype=np.int32),
+        "ctr": np.array([10.0, 5.0, 17.5], dtype=np.float32),
+        "position": np.array([2.0, 8.5, 1.2], dtype=np.float32),
+        "segment": pd.Categorical(["Store & Local", "Product", "Brand (Pure)"], categories=SEGMENT_CATEGORIES),
+        "store": pd.Categorical(["Leeds", None, None], categories=STORE_ORDER),
+    })
+
+
+def empty_cube(token="empty"):
+    return Cube(filter_frame(frame(), []), token)
+
+
+def assert_measures_numeric(agg):
+    for column in list(MEASURES) + ["ctr", "position"]:
+        assert is_numeric_dtype(agg[column]), column
+
+
+@pytest.mark.parametrize("by", [["query", "segment", "store"], ["page"], ["date", "segment"], ["store", "segment"]])
+def test_aggregate_of_empty_frame_keeps_dtypes(by):
+    empty = filter_frame(frame(), [])
+    agg = aggregate(empty, by)
+    assert agg.empty
+    assert_measures_numeric(agg)
+    if "date" in by:
+        assert is_datetime64_any_dtype(agg["date"])
+        agg["date"].dt.to_period("W")
+
+
+def test_rollup_of_empty_aggregate_keeps_dtypes():
+    days = empty_cube().days
+    agg = rollup(days, ["date"])
+    assert agg.empty
+    assert_measures_numeric(agg)
+    assert is_datetime64_any_dtype(agg["date"])
+
+
+@pytest.mark.parametrize("granularity", ["Day", "Week", "Month"])
+def test_period_rollup_of_empty_cube(granularity):
+    periods = period_rollup(empty_cube().days, granularity)
+    assert periods.empty
+    assert list(periods.columns) == ["period", "Clicks", "Impressions", "CTR", "Position"]
+
+
+def test_period_rollup_totals():
+    periods = period_rollup(Cube(frame()).days, "Week")
+    assert periods["Clicks"].tolist() == [4, 7]
+
+
+@pytest.mark.parametrize("current, previous", [
+    (empty_cube("a"), empty_cube("b")),
+    (Cube(frame(), "c"), empty_cube("d")),
+    (empty_cube("e"), Cube(frame(), "f")),
+])
+def test_views_handle_empty_cubes(current, previous):
+    merged = winners_losers.compare_queries(current.token, previous.token, current, previous)
+    merged.nlargest(20, "click_change")
+    merged.nsmallest(20, "click_change")
+    merged.nlargest(20, "pos_change")
+    overview.performance_series(current.token, "Week", current)
+    categories.category_series(current.token, ("Brand (Pure)", "Product"), "Month", current)
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from utils.deltas import calc_change, change_labels, pct_change, round_half
+
+
+# Changes that land on a .x5 tie in decimal, where plain np.round disagrees with round().
+@pytest.mark.parametrize("curr, prev, expected", [
+    (8.37, 20.0, -58.1),
+    (29.69, 20.0, 48.5),
+    (24.59, 20.0, 22.9),
+    (43.11, 20.0, 115.5),
+    (42.77, 20.0, 113.9),
+])
+def test_pct_change_breaks_ties_like_calc_change(curr, prev, expected):
+    assert calc_change(curr, prev) == expected
+    assert pct_change([curr], [prev])[0] == expected
+
+
+def test_pct_change_matches_calc_change_on_random_values():
+    rng = np.random.default_rng(0)
+    curr = np.round(rng.uniform(0, 50, 50_000), 2)
+    prev = np.round(rng.uniform(0, 50, 50_000), 2)
+    prev[::50] = 0
+    expected = [calc_change(c, p) for c, p in zip(curr.tolist(), prev.tolist())]
+    assert pct_change(curr, prev).tolist() == expected
+
+
+def test_pct_change_is_100_when_prev_is_zero():
+    assert pct_change([0, 5], [0, 0]).tolist() == [100.0, 100.0]
+
+
+@pytest.mark.parametrize("ndigits", [1, 2])
+def test_round_half_matches_round(ndigits):
+    rng = np.random.default_rng(1)
+    values = np.round(rng.uniform(0, 100, 20_000), ndigits + 1)
+    assert round_half(values, ndigits).tolist() == [round(v, ndigits) for v in values.tolist()]
+
+
+def test_change_labels():
+    assert change_labels([12.5, -3.0, 0.0]).tolist() == ["▲ 12.5%", "▼ 3.0%", "▲ 0.0%"]
@@ -0,0 +1,32 @@
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from utils import gsc, warehouse
+from utils.backends import FakeBackend, use_backend
+
+PAGES = ["Overview", "Winners & Losers", "New & Lost", "Categories", "Page Performance", "Query Explorer"]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setattr(warehouse, "WAREHOUSE_DIR", str(tmp_path))
+    monkeypatch.setattr(gsc, "GSC_QPS", 1_000_000)
+    monkeypatch.setattr(gsc, "GSC_BURST", 1_000_000)
+    use_backend(FakeBackend(rows_per_day=200))
+    at = AppTest.from_file("../app.py", default_timeout=120)
+    at.secrets["auth"] = {"password": "test"}
+    at.session_state["authenticated"] = True
+    at.session_state["loaded"] = True
+    at.session_state["date_option"] = "Last 7 days"
+    yield at
+    use_backend(None)
+
+
+@pytest.mark.parametrize("segments", [[], ["Category"]])
+def test_pages_render_with_an_empty_segment_filter(app, segments):
+    app.run()
+    next(box for box in app.multiselect if box.label == "Segments").set_value(segments)
+    for page in PAGES:
+        app.session_state["page"] = page
+        app.run()
+        assert not app.exception, (page, [e.value for e in app.exception])
@@ -0,0 +1,107 @@
+import random
+from contextlib import closing
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from utils import warehouse
+from utils.ingest import ResponseColumns
+
+PROPERTY = "sc-domain:example.test"
+START = date(2025, 3, 1)
+QUERIES = [f"query {i}" for i in range(40)]
+
+
+@pytest.fixture(autouse=True)
+def warehouse_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(warehouse, "WAREHOUSE_DIR", str(tmp_path))
+
+
+def store(day, queries):
+    columns = ResponseColumns()
+    columns.extend(
+        {"keys": [query, day, "/"], "clicks": 1, "impressions": 10, "ctr": 0.1, "position": 2.0}
+        for query in queries
+    )
+    warehouse.store_day(PROPERTY, day, columns)
+
+
+def activity_table(conn):
+    return sorted(conn.execute("SELECT query_id, first_seen, last_seen, active FROM query_activity"))
+
+
+def random_history(seed, days=60, steps=80):
+    """Store and re-store random days in random order, including emptied and backdated days."""
+    rng = random.Random(seed)
+    for _ in range(steps):
+        day = (START + timedelta(days=rng.randrange(days))).isoformat()
+        store(day, rng.sample(QUERIES, rng.choice([0, 1, 3, 10, 25])))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_activity_matches_rebuild(seed):
+    random_history(seed)
+    with closing(warehouse.connect(PROPERTY)) as conn:
+        incremental = activity_table(conn)
+        warehouse.rebuild_query_activity(conn)
+        assert incremental == activity_table(conn)
+
+
+def test_activity_follows_days_that_are_emptied():
+    store("2025-03-05", ["a", "b"])
+    store("2025-03-01", ["a"])
+    store("2025-03-09", ["a"])
+    store("2025-03-01", [])
+    store("2025-03-05", ["b"])
+    with closing(warehouse.connect(PROPERTY)) as conn:
+        rows = {query: (first, last) for query, first, last in conn.execute(
+            "SELECT q.query, a.first_seen, a.last_seen FROM query_activity a JOIN queries q ON q.id = a.query_id"
+        )}
+    assert rows == {"a": ("2025-03-09", "2025-03-09"), "b": ("2025-03-05", "2025-03-05")}
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_query_activity_windows_match_rows(seed):
+    random_history(seed)
+    windows = [("2025-03-01", "2025-03-07"), ("2025-03-10", "2025-03-10"),
+               ("2025-03-15", "2025-04-10"), ("2025-05-01", "2025-05-31")]
+    first_seen, last_seen, flags = warehouse.query_activity(PROPERTY, *windows)
+
+    with closing(warehouse.connect(PROPERTY)) as conn:
+        size = conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+        days_by_code = {}
+        for query_id, day in conn.execute("SELECT DISTINCT query_id, day FROM rows"):
+            days_by_code.setdefault(query_id - 1, []).append(day)
+
+    for code in range(size):
+        days = sorted(days_by_code.get(code, []))
+        if days:
+            assert str(first_seen[code]) == days[0]
+            assert str(last_seen[code]) == days[-1]
+        else:
+            assert np.isnat(first_seen[code]) and np.isnat(last_seen[code])
+        for (lo, hi), active in zip(windows, flags):
+            assert active[code] == any(lo <= day <= hi for day in days), (code, lo, hi)
+
+
+def days_ago(n):
+    return (date.today() - timedelta(days=n)).isoformat()
+
+
+def test_old_empty_day_is_final():
+    old = days_ago(warehouse.FINAL_LAG_DAYS + warehouse.EMPTY_GRACE_DAYS + 30)
+    store(old, [])
+    # A negative max_age treats every non-final day as expired.
+    assert warehouse.missing_days(PROPERTY, old, old, max_age=-60) == []
+
+
+def test_recent_empty_day_is_fetched_again():
+    settled = days_ago(warehouse.FINAL_LAG_DAYS + 1)
+    late = days_ago(warehouse.FINAL_LAG_DAYS + warehouse.EMPTY_GRACE_DAYS - 1)
+    store(settled, ["a"])
+    store(late, [])
+    assert warehouse.missing_days(PROPERTY, settled, settled, max_age=-60) == []
+    assert warehouse.missing_days(PROPERTY, late, late, max_age=-60) == [late]
+    store(late, ["a"])
+    assert warehouse.missing_days(PROPERTY, late, late, max_age=-60) == []
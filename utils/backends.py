@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import streamlit as st
+
+from utils.fakes import FINAL_LAG_DAYS, FakeSearchConsole, FakeSheets, SyntheticSearchData, classification_rows
+from utils.transport import get_credentials, thread_service
+
+# Overrides the `name` in the [backend] secrets table, e.g. GSC_BACKEND=fake.
+BACKEND_ENV = "GSC_BACKEND"
+
+# Set by use_backend, e.g. by the benchmarks to swap datasets without touching secrets.
+_override = None
+
+
+class GoogleBackend:
+    """The live Search Console and Sheets APIs, on the service account from st.secrets."""
+
+    name = "google"
+
+    def __init__(self):
+        self.credentials = get_credentials()
+
+    def service(self, name, version):
+        return thread_service(name, version, self.credentials)
+
+    @property
+    def property_url(self):
+        return st.secrets["gsc"]["property_url"]
+
+    @property
+    def sheet_id(self):
+        return st.secrets["sheets"]["sheet_id"]
+
+
+class FakeBackend:
+    """In-process Search Console and Sheets serving synthetic data; needs no credentials.
+
+    `latency` (seconds per request) and `error_rate` (share of requests failing with
+    429 or 503) make it possible to exercise the sync, retry and rate-limit paths;
+    `final_lag_days` above the warehouse's FINAL_LAG_DAYS leaves old days unfinalised.
+    """
+
+    name = "fake"
+    property_url = "sc-domain:example.test"
+    sheet_id = "fake-classifications"
+
+    def __init__(self, rows_per_day=10_000, queries=60_000, pages=4_000, seed=0,
+                 latency=0.0, error_rate=0.0, final_lag_days=FINAL_LAG_DAYS):
+        self.data = SyntheticSearchData(queries, pages, rows_per_day, seed)
+        options = {"latency": latency, "error_rate": error_rate, "seed": seed}
+        self.services = {
+            ("searchconsole", "v1"): FakeSearchConsole(self.data, final_lag_days, **options),
+            ("sheets", "v4"): FakeSheets(
+                classification_rows(self.data.queries, np.random.default_rng(seed)), **options
+            ),
+        }
+
+    def service(self, name, version):
+        return self.services[(name, version)]
+
+
+BACKENDS = {"google": GoogleBackend, "fake": FakeBackend}
+
+
+def _backend_settings():
+    try:
+        return dict(st.secrets.get("backend", {}))
+    except FileNotFoundError:
+        # No secrets.toml at all, which is normal when running against the fake.
+        return {}
+
+
+@st.cache_resource
+def _configured_backend():
+    settings = _backend_settings()
+    name = os.environ.get(BACKEND_ENV) or settings.get("name", "google")
+    settings.pop("name", None)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](**settings)
+
+
+def use_backend(backend):
+    """Route every API call through `backend` instead of the configured one; None restores it."""
+    global _override
+    _override = backend
+
+
+def get_backend():
+    """The backend every API call resolves through, chosen by $GSC_BACKEND or [backend] name."""
+    return _override or _configured_backend()
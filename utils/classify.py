@@ -1,3 +1,8 @@
+from functools import lru_cache
+
+from utils.matcher import AhoCorasick
+from utils.telemetry import track_lru
+
 ALL_SEGMENTS = [
     "Brand (Pure)",
     "Brand + Location",
@@ -70,42 +75,88 @@ ONLINE_TERMS = [
 ]
 
 
+GENERIC_SHOP_TERMS = ["sex shop", "sex shops", "adult shop", "adult store"]
+
+# Store matches that are dropped when the query also contains the given term.
+STORE_EXCLUSIONS = {
+    "A63 / Hull Brough": "middlesbrough",
+    "Hull": "solihull",
+}
+
+STORE_ORDER = list(STORE_LOCATIONS)
+
+# Every segment classify_query can return; "Noise" is never offered as a filter.
+SEGMENT_CATEGORIES = ALL_SEGMENTS + ["Noise"]
+
+
+def _build_term_matcher():
+    patterns = {}
+
+    def add(terms, label):
+        for term in terms:
+            patterns.setdefault(term, set()).add(label)
+
+    add(NOISE_TERMS, "noise")
+    add(BRAND_PURE_TERMS, "brand")
+    add(NEAR_ME_TERMS, "near_me")
+    add(ONLINE_TERMS, "online")
+    add(GENERIC_SHOP_TERMS, "generic")
+    for i, terms in enumerate(STORE_LOCATIONS.values()):
+        add(terms, ("store", i))
+    for store, term in STORE_EXCLUSIONS.items():
+        add([term], ("exclude", store))
+    return AhoCorasick(patterns)
+
+
+_TERM_MATCHER = _build_term_matcher()
+
+
 def classify_query(query, manual_classifications=None):
     """Classify a query, checking manual overrides first."""
-    q = query.lower().strip()
-
     if manual_classifications and query in manual_classifications:
         seg, store = manual_classifications[query]
         return seg, store
 
-    if any(n in q for n in NOISE_TERMS):
-        if not any(b in q for b in BRAND_PURE_TERMS):
-            return "Noise", None
+    return auto_classify(query)
 
-    is_brand = any(b in q for b in BRAND_PURE_TERMS)
 
-    for store, terms in STORE_LOCATIONS.items():
-        for term in terms:
-            if term in q:
-                if store == "A63 / Hull Brough" and "middlesbrough" in q:
-                    continue
-                if store == "Hull" and "solihull" in q:
-                    continue
-                if is_brand:
-                    return "Brand + Location", store
-                else:
-                    return "Store & Local", store
+@lru_cache(maxsize=200_000)
+def auto_classify(query):
+    """Rule-based classification only; memoised because queries repeat across days and pages."""
+    q = query.lower().strip()
+
+    matched = _TERM_MATCHER.labels(q)
+    if not matched:
+        return "Other", None
+
+    is_brand = "brand" in matched
+
+    if "noise" in matched and not is_brand:
+        return "Noise", None
+
+    store_hits = sorted(label[1] for label in matched if label[0] == "store")
+    for i in store_hits:
+        store = STORE_ORDER[i]
+        if ("exclude", store) in matched:
+            continue
+        if is_brand:
+            return "Brand + Location", store
+        else:
+            return "Store & Local", store
 
     if is_brand:
         return "Brand (Pure)", None
 
-    if any(t in q for t in NEAR_ME_TERMS):
+    if "near_me" in matched:
         return "Store Intent (Near Me)", None
 
-    if any(t in q for t in ONLINE_TERMS):
+    if "online" in matched:
         return "Online / National", None
 
-    if "sex shop" in q or "sex shops" in q or "adult shop" in q or "adult store" in q:
+    if "generic" in matched:
         return "Generic Sex Shop", None
 
     return "Other", None
+
+
+track_lru("classify.auto_classify", auto_classify)
@@ -0,0 +1,130 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.telemetry import cached, timed
+
+# Additive measures only, so any rollup of a rollup is exact; means are derived at read time.
+MEASURES = dict(
+    clicks=("clicks", "sum"),
+    impressions=("impressions", "sum"),
+    ctr_sum=("ctr", "sum"),
+    position_sum=("position", "sum"),
+    rows=("clicks", "size"),
+)
+
+
+class Cube:
+    """Pre-aggregated rollups of one filtered dataset, shared by every view.
+
+    queries      one row per query, with its segment and store
+    pages        one row per landing page
+    page_days    (page, date)
+    page_queries (page, query)
+    days         (date, segment)
+    stores       (store, segment), rows with a store only
+    segments     one row per segment
+    rows         the row-level frame, for the few measures that are not additive
+
+    `token` identifies the dataset and filter state the cube was built from; views key
+    their own memoised computations on it instead of hashing DataFrames.
+    """
+
+    def __init__(self, df, token=None):
+        self.token = token
+        base = df.assign(
+            clicks=df["clicks"].astype("int64"),
+            impressions=df["impressions"].astype("int64"),
+            ctr=df["ctr"].astype("float64").round(2),
+            position=df["position"].astype("float64").round(1),
+        )
+        self.rows = df
+        self.queries = aggregate(base, ["query", "segment", "store"], dropna=False)
+        self.pages = aggregate(base, ["page"])
+        self.page_days = aggregate(base, ["page", "date"])
+        self.page_queries = aggregate(base, ["page", "query"])
+        self.days = aggregate(base, ["date", "segment"])
+        self.stores = aggregate(base, ["store", "segment"])
+        self.segments = aggregate(base, ["segment"])
+
+    @property
+    def empty(self):
+        return self.rows.empty
+
+
+def aggregate(df, by, dropna=True):
+    """Sum MEASURES per group; an empty frame gives an empty rollup with the same dtypes."""
+    agg = df.groupby(by, observed=True, dropna=dropna).agg(**MEASURES).reset_index()
+    return with_means(agg)
+
+
+def with_means(agg):
+    """Add mean ctr and position columns, matching a row-level groupby mean."""
+    rows = agg["rows"].where(agg["rows"] > 0)
+    agg["ctr"] = agg["ctr_sum"] / rows
+    agg["position"] = agg["position_sum"] / rows
+    return agg
+
+
+def rollup(agg, by):
+    """Re-aggregate an existing rollup to coarser keys."""
+    sums = ["clicks", "impressions", "ctr_sum", "position_sum", "rows"]
+    return with_means(agg.groupby(by, observed=True)[sums].sum().reset_index())
+
+
+def totals(agg):
+    rows = agg["rows"].sum()
+    return dict(
+        clicks=agg["clicks"].sum(),
+        impressions=agg["impressions"].sum(),
+        ctr=agg["ctr_sum"].sum() / rows if rows else np.nan,
+        position=agg["position_sum"].sum() / rows if rows else np.nan,
+    )
+
+
+def period_rollup(agg, granularity):
+    """Roll a per-date aggregate up to Day/Week/Month periods for the trend charts."""
+    agg = agg.assign(period=agg["date"])
+    if granularity == "Week":
+        agg["period"] = agg["date"].dt.to_period("W").dt.start_time
+    elif granularity == "Month":
+        agg["period"] = agg["date"].dt.to_period("M").dt.start_time
+    periods = rollup(agg, ["period"])
+    return periods.rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "ctr": "CTR", "position": "Position"
+    })[["period", "Clicks", "Impressions", "CTR", "Position"]]
+
+
+def query_codes(current, previous):
+    """Integer query ids for two per-query rollups, in one shared vocabulary.
+
+    Frames assembled together share a query dtype, so their category codes are used as-is;
+    anything else is factorized against the union of both columns.
+    """
+    a, b = current["query"], previous["query"]
+    if isinstance(a.dtype, pd.CategoricalDtype) and a.dtype == b.dtype:
+        return a.cat.codes.to_numpy(), b.cat.codes.to_numpy()
+    codes, _ = pd.factorize(pd.concat([a.astype(object), b.astype(object)], ignore_index=True))
+    return codes[:len(a)], codes[len(a):]
+
+
+@timed("filter")
+def filter_frame(frame, segments, store="All Stores"):
+    """Apply the sidebar filters; Noise and Not Relevant rows are always dropped."""
+    filtered = frame[frame["segment"].isin(segments)]
+    if store != "All Stores":
+        filtered = filtered[filtered["store"] == store]
+    return filtered[~filtered["segment"].isin(["Noise", "Not Relevant"])]
+
+
+def cube_token(version, *filter_state):
+    """Stable token for a dataset version plus the filters applied to it."""
+    return hashlib.sha1(repr((version, filter_state)).encode()).hexdigest()[:16]
+
+
+@cached("cube.build", st.cache_resource(max_entries=8, show_spinner=False))
+def cached_cube(token, _build):
+    """Build the cube for a token once; `_build` returns the filtered frame and only runs on a miss."""
+    return Cube(_build(), token)
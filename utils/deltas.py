@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+
+def calc_change(curr, prev):
+    """Percentage change from prev to curr, rounded to 1dp; 100.0 when prev is 0."""
+    if prev == 0:
+        return 100.0
+    return round(((curr - prev) / prev) * 100, 1)
+
+
+def round_half(values, ndigits):
+    """np.round that agrees with Python's round() value for value.
+
+    np.round scales by 10**ndigits first, so values within float error of a .x5 tie can
+    land on the other side of Python's round(); just those are redone one at a time.
+    """
+    values = np.asarray(values, dtype="float64")
+    with np.errstate(invalid="ignore"):
+        rounded = np.round(values, ndigits)
+        scaled = values * 10 ** ndigits
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_tie):
+        rounded.flat[i] = round(float(values.flat[i]), ndigits)
+    return rounded
+
+
+def pct_change(curr, prev):
+    """Vectorised calc_change over aligned arrays or Series."""
+    curr = np.asarray(curr, dtype="float64")
+    prev = np.asarray(prev, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change = round_half((curr - prev) / prev * 100, 1)
+    return np.where(prev == 0, 100.0, change)
+
+
+def arrow(change):
+    return "▲" if change >= 0 else "▼"
+
+
+def change_labels(change, symbol=None):
+    """Format changes as '▲ 12.5%' strings; `symbol` fixes the arrow instead of using the sign."""
+    change = pd.Series(change)
+    if symbol is None:
+        symbols = pd.Series(np.where(change >= 0, "▲", "▼"), index=change.index)
+    else:
+        symbols = symbol
+    return symbols + " " + change.abs().astype(str) + "%"
@@ -0,0 +1,400 @@
+import re
+import threading
+import time
+from datetime import date, timedelta
+from functools import lru_cache
+
+import httplib2
+import numpy as np
+import pandas as pd
+from googleapiclient.errors import HttpError
+
+from utils.classify import (
+    BRAND_PURE_TERMS, GENERIC_SHOP_TERMS, NEAR_ME_TERMS, NOISE_TERMS, ONLINE_TERMS,
+    STORE_LOCATIONS, auto_classify
+)
+
+# Search Analytics caps rowLimit at 25,000 per request.
+MAX_ROW_LIMIT = 25000
+
+# Final data trails real time by a couple of days; "all" also serves the fresh days.
+FINAL_LAG_DAYS = 2
+
+PRODUCTS = [
+    "vibrator", "rabbit vibrator", "dildo", "butt plug", "cock ring", "strap on", "lube",
+    "water based lube", "bullet vibrator", "wand", "love egg", "masturbator", "lingerie",
+    "basque", "stockings", "handcuffs", "blindfold", "whip", "paddle", "bondage kit",
+    "nipple clamps", "anal beads", "prostate massager", "couples toy", "suction toy",
+    "thrusting dildo", "glass dildo", "penis pump", "delay spray", "massage oil",
+]
+
+MODIFIERS = [
+    "best", "cheap", "large", "small", "beginner", "luxury", "waterproof", "rechargeable",
+    "silicone", "realistic", "quiet", "wireless", "remote control", "discreet", "pink",
+    "black", "vegan", "heated", "mini", "double",
+]
+
+QUALIFIERS = [
+    "", "for women", "for men", "for couples", "reviews", "sale", "gift", "set", "how to use",
+    "vs", "near me", "uk", "online", "deals", "2 pack", "review", "size guide", "ideas",
+]
+
+CATEGORY_PATHS = [
+    "vibrators", "all-vibrators", "rabbits-and-eggs", "dildos", "strap-ons", "lubes",
+    "water-based-lube", "lingerie", "stockings", "bondage", "toys-for-him", "toys-for-her",
+    "toys-for-both", "top-sellers", "special-offers", "gift-sets", "anal-toys", "cock-rings",
+]
+
+
+def _dedupe(items):
+    return list(dict.fromkeys(items))
+
+
+def make_queries(rng, count):
+    """A query vocabulary in popularity order: brand terms first, then a shuffled long tail.
+
+    The head mixes every segment the rule classifier knows about, so generated data
+    exercises brand, brand + location, store, near-me, online, generic and noise paths.
+    """
+    locations = [term for terms in STORE_LOCATIONS.values() for term in terms]
+    brand = _dedupe(BRAND_PURE_TERMS)
+    head = (
+        [f"{term} {place}" for term in brand[:6] for place in locations]
+        + [f"{shop} {place}" for shop in GENERIC_SHOP_TERMS for place in locations]
+        + [f"{place} {shop}" for shop in GENERIC_SHOP_TERMS for place in locations]
+        + [f"{shop} {near}" for shop in GENERIC_SHOP_TERMS for near in NEAR_ME_TERMS]
+        + [f"{product}{online}" if online.startswith(" ") else f"{product} {online}"
+           for product in PRODUCTS for online in ONLINE_TERMS]
+        + list(GENERIC_SHOP_TERMS) + list(NOISE_TERMS)
+    )
+    tail = [
+        " ".join(filter(None, (modifier, product, qualifier)))
+        for product in PRODUCTS for modifier in [""] + MODIFIERS for qualifier in QUALIFIERS
+    ]
+    rest = _dedupe(term for term in head + tail if term not in brand)
+    rng.shuffle(rest)
+    queries = _dedupe(brand + rest)
+    for i in range(len(queries), count):
+        # Numbered model names fill out the long tail once the word combinations run out.
+        queries.append(f"{PRODUCTS[i % len(PRODUCTS)]} {MODIFIERS[i % len(MODIFIERS)]} {i}")
+    return queries[:count]
+
+
+def make_pages(site, count):
+    locations = [terms[0] for terms in STORE_LOCATIONS.values()]
+    pages = (
+        [f"{site}/"]
+        + [f"{site}/{path}/" for path in CATEGORY_PATHS]
+        + [f"{site}/sex-shops-near-me/{place.replace(' ', '-')}/" for place in locations]
+        + [f"{site}/{place.replace(' ', '-')}-store/" for place in locations]
+    )
+    for i in range(len(pages), count):
+        product = PRODUCTS[i % len(PRODUCTS)].replace(" ", "-")
+        modifier = MODIFIERS[(i // len(PRODUCTS)) % len(MODIFIERS)].replace(" ", "-")
+        pages.append(f"{site}/product/{modifier}-{product}-{i}/")
+    return pages[:count]
+
+
+class SyntheticSearchData:
+    """Deterministic Search Console rows: Zipf-distributed queries over a fixed vocabulary.
+
+    Each day is generated from (seed, date), so re-fetching a day returns identical rows,
+    which is what the warehouse expects of final data. Query popularity, landing pages and
+    average positions are fixed per query; which queries show up, and how often, varies
+    day to day, with a mild weekend lift.
+    """
+
+    def __init__(self, queries=60_000, pages=4_000, rows_per_day=10_000, seed=0,
+                 site="https://www.example.test"):
+        rng = np.random.default_rng(seed)
+        self.seed = seed
+        self.rows_per_day = rows_per_day
+        self.queries = np.array(make_queries(rng, queries), dtype=object)
+        self.pages = np.array(make_pages(site, pages), dtype=object)
+
+        weights = 1 / np.arange(1, len(self.queries) + 1) ** 1.05
+        self.weights = weights / weights.sum()
+        self.base_impressions = np.maximum(0.2, 4000 * weights / weights[0])
+        self.base_position = np.clip(
+            rng.gamma(2.0, 6.0, len(self.queries)) + np.log1p(np.arange(len(self.queries))) / 2,
+            1, 90
+        )
+        # Brand queries rank first and land on the homepage.
+        self.base_position[:len(BRAND_PURE_TERMS)] = rng.uniform(1, 1.5, len(BRAND_PURE_TERMS))
+        self.primary_page = rng.integers(0, len(self.pages), len(self.queries))
+        self.primary_page[:len(BRAND_PURE_TERMS)] = 0
+        self.secondary_page = rng.integers(0, len(self.pages), len(self.queries))
+        self.secondary_page[:len(BRAND_PURE_TERMS)] = 0
+        self.day = lru_cache(maxsize=64)(self._generate_day)
+
+    def _generate_day(self, day):
+        """Columns for one date, sorted by clicks then impressions like the API."""
+        rng = np.random.default_rng([self.seed, day.toordinal()])
+        lift = 1.15 if day.weekday() >= 5 else 1.0
+        n = int(self.rows_per_day * lift * rng.uniform(0.9, 1.1))
+        # One row per (query, page), as the API aggregates within a key. Popular queries
+        # repeat, so keep drawing until there are n distinct keys or the vocabulary runs dry.
+        draws = np.empty(0, dtype=np.int64)
+        for _ in range(8):
+            queries = rng.choice(len(self.queries), size=2 * n, p=self.weights)
+            pages = np.where(rng.random(2 * n) < 0.8, self.primary_page[queries], self.secondary_page[queries])
+            draws = np.concatenate([draws, queries.astype(np.int64) * len(self.pages) + pages])
+            keys, first = np.unique(draws, return_index=True)
+            if len(keys) >= n:
+                break
+        keys = np.sort(keys[np.argsort(first)[:n]])
+        queries, pages = keys // len(self.pages), keys % len(self.pages)
+
+        impressions = 1 + rng.poisson(self.base_impressions[queries] * lift)
+        position = np.clip(self.base_position[queries] + rng.normal(0, 1.5, len(keys)), 1, 100)
+        clicks = rng.binomial(impressions, np.clip(0.35 / position ** 0.9, 0, 1))
+        order = np.lexsort((-impressions, -clicks))
+        return {
+            "query": queries[order],
+            "page": pages[order],
+            "clicks": clicks[order],
+            "impressions": impressions[order],
+            "position": position[order].round(2),
+        }
+
+    def frame(self, start, end):
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        parts = [self.day(day) for day in days]
+        lengths = [len(part["query"]) for part in parts]
+        if not sum(lengths):
+            return pd.DataFrame(columns=["query", "date", "page", "clicks", "impressions", "position"])
+        return pd.DataFrame({
+            "query": self.queries[np.concatenate([part["query"] for part in parts])],
+            "date": np.repeat([day.isoformat() for day in days], lengths),
+            "page": self.pages[np.concatenate([part["page"] for part in parts])],
+            "clicks": np.concatenate([part["clicks"] for part in parts]),
+            "impressions": np.concatenate([part["impressions"] for part in parts]),
+            "position": np.concatenate([part["position"] for part in parts]),
+        })
+
+
+def _http_error(status, message):
+    return HttpError(httplib2.Response({"status": status}), message.encode())
+
+
+class FakeRequest:
+    """Stands in for a googleapiclient HttpRequest: nothing happens until execute()."""
+
+    def __init__(self, api, fn):
+        self.api = api
+        self.fn = fn
+
+    def execute(self, num_retries=0):
+        return self.api.call(self.fn)
+
+
+class _FakeApi:
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def call(self, fn):
+        with self.lock:
+            self.calls += 1
+            fail = self.error_rate and self.rng.random() < self.error_rate
+            status = 429 if self.rng.random() < 0.5 else 503
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise _http_error(status, "Injected failure")
+        return fn()
+
+
+class FakeSearchConsole(_FakeApi):
+    """searchconsole v1 with searchanalytics().query, served from SyntheticSearchData."""
+
+    def __init__(self, data, final_lag_days=FINAL_LAG_DAYS, **options):
+        super().__init__(**options)
+        self.data = data
+        self.final_lag_days = final_lag_days
+
+    def searchanalytics(self):
+        return self
+
+    def query(self, siteUrl, body):
+        return FakeRequest(self, lambda: self._query(body))
+
+    def _query(self, body):
+        try:
+            start = date.fromisoformat(body["startDate"])
+            end = date.fromisoformat(body["endDate"])
+        except (KeyError, ValueError):
+            raise _http_error(400, "startDate and endDate must be YYYY-MM-DD")
+        row_limit = body.get("rowLimit", 1000)
+        if not 1 <= row_limit <= MAX_ROW_LIMIT:
+            raise _http_error(400, f"rowLimit must be between 1 and {MAX_ROW_LIMIT}")
+        dimensions = body.get("dimensions", [])
+        if set(dimensions) - {"query", "date", "page"}:
+            raise _http_error(400, f"Unsupported dimensions {dimensions}")
+
+        lag = self.final_lag_days if body.get("dataState", "final") == "final" else 1
+        end = min(end, date.today() - timedelta(days=lag))
+        df = self.data.frame(start, end)
+        if dimensions != ["query", "date", "page"]:
+            df = self._aggregate(df, dimensions)
+        elif start < end:
+            df = df.sort_values(["clicks", "impressions"], ascending=False, kind="stable")
+
+        start_row = body.get("startRow", 0)
+        page = df.iloc[start_row:start_row + row_limit]
+        if page.empty:
+            return {"responseAggregationType": "byPage"}
+        keys = page[dimensions].to_numpy().tolist() if dimensions else [[] for _ in range(len(page))]
+        ctr = page["clicks"] / page["impressions"]
+        return {
+            "rows": [
+                {"keys": key, "clicks": clicks, "impressions": impressions, "ctr": rate, "position": position}
+                for key, clicks, impressions, rate, position in zip(
+                    keys, page["clicks"].tolist(), page["impressions"].tolist(),
+                    ctr.tolist(), page["position"].tolist()
+                )
+            ],
+            "responseAggregationType": "byPage",
+        }
+
+    @staticmethod
+    def _aggregate(df, dimensions):
+        df = df.assign(weighted=df["position"] * df["impressions"])
+        grouped = df.groupby(dimensions, sort=False) if dimensions else df.groupby(lambda _: 0)
+        out = grouped[["clicks", "impressions", "weighted"]].sum().reset_index(drop=not dimensions)
+        out["position"] = (out.pop("weighted") / out["impressions"]).round(2)
+        return out.sort_values(["clicks", "impressions"], ascending=False, kind="stable")
+
+
+_RANGE = re.compile(r"^(?:[^!]+!)?([A-Z]+)(\d+)?(?::([A-Z]+)(\d+)?)?$")
+
+
+def _column(letters):
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - 64
+    return index - 1
+
+
+def parse_range(a1):
+    """'Sheet1!A2:C5' -> (first row, last row, first col, last col), 0-based; rows may be None."""
+    match = _RANGE.match(a1)
+    if not match:
+        raise _http_error(400, f"Unable to parse range: {a1}")
+    first_col, first_row, last_col, last_row = match.groups()
+    first_row = int(first_row) - 1 if first_row else None
+    if last_col is None:
+        return first_row, first_row, _column(first_col), _column(first_col)
+    return first_row, int(last_row) - 1 if last_row else None, _column(first_col), _column(last_col)
+
+
+class FakeSheets(_FakeApi):
+    """sheets v4 spreadsheets().values() get/update/batchUpdate/append/clear on one in-memory grid.
+
+    Every spreadsheet id and sheet name maps to the same grid, which is all the
+    dashboard uses. Trailing blank cells and rows are trimmed on read, as the API does.
+    """
+
+    def __init__(self, rows=None, **options):
+        super().__init__(**options)
+        self.rows = [list(row) for row in rows or []]
+        self.grid_lock = threading.Lock()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range, **kwargs):
+        return FakeRequest(self, lambda: self._get(range))
+
+    def update(self, spreadsheetId, range, body, valueInputOption="RAW", **kwargs):
+        return FakeRequest(self, lambda: self._write(range, body["values"]))
+
+    def batchUpdate(self, spreadsheetId, body):
+        def run():
+            responses = [self._write(data["range"], data["values"]) for data in body.get("data", [])]
+            return {"spreadsheetId": spreadsheetId, "responses": responses}
+        return FakeRequest(self, run)
+
+    def append(self, spreadsheetId, range, body, valueInputOption="RAW", insertDataOption="OVERWRITE",
+               **kwargs):
+        return FakeRequest(self, lambda: self._append(range, body["values"]))
+
+    def clear(self, spreadsheetId, range, body=None):
+        return FakeRequest(self, lambda: self._clear(range))
+
+    def _get(self, a1):
+        first_row, last_row, first_col, last_col = parse_range(a1)
+        with self.grid_lock:
+            rows = self.rows[first_row or 0:None if last_row is None else last_row + 1]
+            values = [row[first_col:last_col + 1] for row in rows]
+        values = [row[:max((i + 1 for i, cell in enumerate(row) if cell != ""), default=0)] for row in values]
+        while values and not values[-1]:
+            values.pop()
+        response = {"range": a1, "majorDimension": "ROWS"}
+        if values:
+            response["values"] = values
+        return response
+
+    def _write(self, a1, values):
+        first_row, _, first_col, _ = parse_range(a1)
+        first_row = first_row or 0
+        with self.grid_lock:
+            for offset, row in enumerate(values):
+                self._set_row(first_row + offset, first_col, row)
+        return {"updatedRange": a1, "updatedRows": len(values)}
+
+    def _set_row(self, index, first_col, values):
+        while len(self.rows) <= index:
+            self.rows.append([])
+        row = self.rows[index]
+        row.extend([""] * (first_col + len(values) - len(row)))
+        row[first_col:first_col + len(values)] = ["" if value is None else value for value in values]
+
+    def _append(self, a1, values):
+        sheet = a1.split("!")[0] if "!" in a1 else "Sheet1"
+        _, _, first_col, _ = parse_range(a1)
+        with self.grid_lock:
+            first = len(self.rows)
+            while first and not any(self.rows[first - 1]):
+                first -= 1
+            for offset, row in enumerate(values):
+                self._set_row(first + offset, first_col, row)
+        width = max((len(row) for row in values), default=1)
+        last_col = chr(65 + first_col + width - 1)
+        return {
+            "tableRange": a1,
+            "updates": {
+                "updatedRange": f"{sheet}!{chr(65 + first_col)}{first + 1}:{last_col}{first + len(values)}",
+                "updatedRows": len(values),
+            },
+        }
+
+    def _clear(self, a1):
+        first_row, last_row, first_col, last_col = parse_range(a1)
+        with self.grid_lock:
+            stop = len(self.rows) if last_row is None else min(last_row + 1, len(self.rows))
+            for row in self.rows[first_row or 0:stop]:
+                row[first_col:last_col + 1] = [""] * len(row[first_col:last_col + 1])
+        return {"clearedRange": a1}
+
+
+def classification_rows(queries, rng, count=300):
+    """A Sheet1 grid like the live one: a header, manual labels, and a few exported blanks."""
+    picks = rng.choice(len(queries), size=min(count, len(queries)), replace=False)
+    rows = [["Query", "Segment", "Store"]]
+    for i, position in enumerate(picks):
+        query = queries[position]
+        segment, store = auto_classify(query)
+        if i % 10 == 0:
+            rows.append([query, "", ""])
+        elif segment in ("Other", "Noise"):
+            rows.append([query, "Product" if i % 3 else "Not Relevant", ""])
+        else:
+            rows.append([query, segment, store or ""])
+    return rows
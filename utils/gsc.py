@@ -1,84 +1,330 @@
 import streamlit as st
 import pandas as pd
-import json
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-from utils.classify import classify_query
+import numpy as np
+import hashlib
+from concurrent.futures import as_completed
+from pandas.api.types import CategoricalDtype
+from utils import warehouse
+from utils.backends import get_backend
+from utils.classify import SEGMENT_CATEGORIES, STORE_ORDER, auto_classify
+from utils.deltas import round_half
+from utils.ingest import ResponseColumns
+from utils.ratelimit import TokenBucket, execute
+from utils.refresh import Refresher
+from utils.singleflight import SingleFlight
 from utils.sheets import load_classifications
+from utils.telemetry import cached, count, timed, timer
+from utils.transport import get_executor
 
+GSC_DIMENSIONS = ["query", "date", "page"]
+GSC_ROW_LIMIT = 25000
+GSC_MAX_WORKERS = 8
 
-@st.cache_resource
-def get_credentials():
-    credentials_info = json.loads(st.secrets["GOOGLE_CREDENTIALS"])
-    credentials = service_account.Credentials.from_service_account_info(
-        credentials_info,
-        scopes=[
-            "https://www.googleapis.com/auth/webmasters.readonly",
-            "https://www.googleapis.com/auth/spreadsheets"
-        ]
-    )
-    return credentials
+# Search Analytics quota: 1,200 queries per minute per site, 30M per day per project.
+GSC_QPS = 20
+GSC_BURST = 20
+GSC_QPD = 30_000_000
+
+# One cached slice per day, so memory is bounded by distinct days rather than ranges.
+MAX_CACHED_DAYS = 800
+
+# The background refresher re-fetches non-final days this long before they would expire.
+REFRESH_AHEAD_SECONDS = 600
+
+# Interactive loads only wait for non-final days older than this, i.e. if the refresher has stalled.
+STALE_LIMIT_SECONDS = 6 * 3600
+
+# Shared by every session in the process, so concurrent syncs of the same day make one API fetch.
+_in_flight = SingleFlight()
 
 
-@st.cache_resource
 def get_gsc_service():
+    """The Search Console service for the calling thread, from the configured backend."""
     try:
-        credentials = get_credentials()
-        service = build("searchconsole", "v1", credentials=credentials)
-        return service
+        return get_backend().service("searchconsole", "v1")
     except Exception as e:
         st.error(f"GSC connection error: {e}")
         return None
 
 
-@st.cache_data(ttl=3600)
-def fetch_gsc_data(start_date, end_date):
-    service = get_gsc_service()
-    if not service:
-        return pd.DataFrame()
+@st.cache_resource
+def gsc_limiter(property_url):
+    """Request budget for one property, shared by every session and worker thread."""
+    return TokenBucket(GSC_QPS, GSC_BURST, daily_limit=GSC_QPD)
 
-    property_url = st.secrets["gsc"]["property_url"]
 
-    try:
-        response = service.searchanalytics().query(
+@timed("gsc.fetch_shard")
+def fetch_shard(service, property_url, shard_start, shard_end, limiter=None):
+    """Page through one shard with startRow until the API runs out of rows."""
+    columns = ResponseColumns()
+    start_row = 0
+    while True:
+        response = execute(service.searchanalytics().query(
             siteUrl=property_url,
             body={
-                "startDate": start_date,
-                "endDate": end_date,
-                "dimensions": ["query", "date", "page"],
-                "rowLimit": 25000,
+                "startDate": shard_start,
+                "endDate": shard_end,
+                "dimensions": GSC_DIMENSIONS,
+                "rowLimit": GSC_ROW_LIMIT,
+                "startRow": start_row,
                 "dataState": "final"
             }
-        ).execute()
+        ), limiter)
+        page = response.get("rows", [])
+        columns.extend(page)
+        count("gsc_rows_fetched", n=len(page))
+        if len(page) < GSC_ROW_LIMIT:
+            return columns
+        start_row += len(page)
 
-        rows = response.get("rows", [])
-        if not rows:
-            return pd.DataFrame()
 
-        manual = load_classifications()
+def fetch_gsc_shards(property_url, shards, max_workers=GSC_MAX_WORKERS, failures=None):
+    """Yield (shard, columns) as each shard finishes, running them on the shared worker pool.
+
+    A shard another session is already fetching is not requested again; this call
+    waits for that fetch and yields the same columns, which callers must not mutate.
+    If `failures` is a list, shards that still fail after retries are appended to it as
+    (shard, error) and skipped instead of aborting the rest.
+    """
+    if not shards:
+        return
+    backend = get_backend()
+    limiter = gsc_limiter(property_url)
+
+    def run(shard):
+        key = (property_url, shard, tuple(GSC_DIMENSIONS))
+        service = backend.service("searchconsole", "v1")
+        columns, shared = _in_flight.do(key, lambda: fetch_shard(service, property_url, *shard, limiter))
+        if shared:
+            count("gsc_shared_fetches")
+        return shard, columns
+
+    pool = get_executor(max_workers)
+    futures = {pool.submit(run, shard): shard for shard in shards}
+    for future in as_completed(futures):
+        try:
+            result = future.result()
+        except Exception as e:
+            count("gsc_shard_failures")
+            if failures is None:
+                raise
+            failures.append((futures[future], e))
+            continue
+        yield result
+
 
-        data = []
-        for row in rows:
-            query = row["keys"][0]
-            date_val = row["keys"][1]
-            page = row["keys"][2]
-            segment, store = classify_query(query, manual)
-            data.append({
-                "query": query,
-                "date": date_val,
-                "page": page,
-                "clicks": row.get("clicks", 0),
-                "impressions": row.get("impressions", 0),
-                "ctr": round(row.get("ctr", 0) * 100, 2),
-                "position": round(row.get("position", 0), 1),
-                "segment": segment,
-                "store": store
-            })
-
-        df = pd.DataFrame(data)
-        df["date"] = pd.to_datetime(df["date"])
-        return df
+@timed("gsc.sync")
+def sync_gsc_range(property_url, start_date, end_date, max_workers=GSC_MAX_WORKERS,
+                   max_age=STALE_LIMIT_SECONDS):
+    """Download only the days the warehouse is missing, storing each as it arrives.
+
+    Recent non-final days are normally kept fresh by the background refresher, so
+    this only waits on them once they are older than `max_age`. Every stored day is a
+    checkpoint: days that fail are returned and simply come up as missing next time.
+    """
+    days = warehouse.missing_days(property_url, start_date, end_date, max_age)
+    failures = []
+    for (day, _), columns in fetch_gsc_shards(property_url, [(d, d) for d in days], max_workers, failures):
+        with timer("warehouse.store_day"):
+            warehouse.store_day(property_url, day, columns)
+    return sorted(day for (day, _), _ in failures)
+
+
+@timed("gsc.refresh")
+def refresh_gsc_range(property_url, start_date, end_date):
+    """Re-fetch the range's stale days and publish them together in one transaction."""
+    max_age = warehouse.RECENT_TTL_SECONDS - REFRESH_AHEAD_SECONDS
+    days = warehouse.missing_days(property_url, start_date, end_date, max_age)
+    if days:
+        shards = [(day, day) for day in days]
+        fetched = {day: columns for (day, _), columns in fetch_gsc_shards(property_url, shards, failures=[])}
+        warehouse.store_days(property_url, fetched)
+    return len(days)
+
+
+@st.cache_resource
+def get_refresher():
+    return Refresher(refresh_gsc_range)
+
+
+@cached("gsc.vocabulary", st.cache_resource(max_entries=4, show_spinner=False))
+def _vocabulary(property_url, version):
+    """Shared query/page dictionaries, so every frame's categoricals use the same codes."""
+    queries, pages = warehouse.load_vocabulary(property_url)
+    return CategoricalDtype(queries), CategoricalDtype(pages)
+
+
+@cached("classify.auto", st.cache_resource(max_entries=4, show_spinner=False))
+def _auto_classes(property_url, version):
+    """Rule-based segment and store codes for every query in the dictionary, classified once each."""
+    query_dtype, _ = _vocabulary(property_url, version)
+    classes = [auto_classify(query) for query in query_dtype.categories]
+    return (
+        pd.Categorical([segment for segment, _ in classes], categories=SEGMENT_CATEGORIES).codes,
+        pd.Categorical([store for _, store in classes], categories=STORE_ORDER).codes,
+    )
+
+
+@timed("classify.manual")
+def apply_manual_classifications(query_dtype, auto_classes, manual):
+    """Overlay manual overrides on the rule-based codes; only the overridden queries change.
+
+    Returns (segment codes, store codes, segment dtype, store dtype). Manual labels that are
+    not known segments or stores are appended as extra categories.
+    """
+    segment_codes, store_codes = auto_classes
+    segment_dtype = CategoricalDtype(SEGMENT_CATEGORIES)
+    store_dtype = CategoricalDtype(STORE_ORDER)
+    if not manual:
+        return segment_codes, store_codes, segment_dtype, store_dtype
+
+    positions = query_dtype.categories.get_indexer(list(manual))
+    known = positions >= 0
+    labels = [label for label, hit in zip(manual.values(), known) if hit]
+    positions = positions[known]
+
+    segments = [segment for segment, _ in labels]
+    # Blank sheet cells can arrive as None or NaN depending on the pandas version.
+    stores = [store if isinstance(store, str) and store else None for _, store in labels]
+    segment_dtype = CategoricalDtype(
+        SEGMENT_CATEGORIES + sorted(set(segments) - set(SEGMENT_CATEGORIES))
+    )
+    store_dtype = CategoricalDtype(
+        STORE_ORDER + sorted({store for store in stores if store} - set(STORE_ORDER))
+    )
+
+    segment_codes = segment_codes.copy()
+    store_codes = store_codes.copy()
+    segment_codes[positions] = pd.Categorical(segments, dtype=segment_dtype).codes
+    store_codes[positions] = pd.Categorical(stores, dtype=store_dtype).codes
+    return segment_codes, store_codes, segment_dtype, store_dtype
+
+
+@cached("gsc.day_frame", st.cache_data(max_entries=MAX_CACHED_DAYS, show_spinner=False))
+def _day_frame(property_url, day, synced_at):
+    return _slice(warehouse.load_day(property_url, day))
+
+
+def _empty_day_frame():
+    return _slice(pd.DataFrame(columns=["query_id", "page_id", "clicks", "impressions", "ctr", "position"]))
+
+
+def _slice(df):
+    """Warehouse rows as a day slice: 0-based codes, narrow counts, ctr in percent."""
+    return pd.DataFrame({
+        "query": (df["query_id"].to_numpy() - 1).astype(np.int32),
+        "page": (df["page_id"].to_numpy() - 1).astype(np.int32),
+        "clicks": df["clicks"].to_numpy().astype(np.int32),
+        "impressions": df["impressions"].to_numpy().astype(np.int32),
+        # Rounded exactly as the per-row round() calls used to, .x5 ties included.
+        "ctr": round_half(df["ctr"].to_numpy() * 100, 2).astype(np.float32),
+        "position": round_half(df["position"].to_numpy(), 1).astype(np.float32),
+    })
+
+
+def dataset_version(*parts):
+    """Short stable token for everything a frame was built from."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+@timed("gsc.day_slices")
+def _day_slices(property_url, start_date, end_date):
+    """The range's stored days as ({day: (final, synced_at)}, [one slice per day, in date order])."""
+    versions = warehouse.day_versions(property_url, start_date, end_date)
+    return versions, [_day_frame(property_url, day, versions[day][1]) for day in sorted(versions)]
+
+
+@timed("gsc.assemble")
+def _assemble(property_url, start_date, end_date, day_slices, version, classes, manual_version):
+    versions, slices = day_slices
+    days = sorted(versions)
+    lengths = [len(frame) for frame in slices]
+    # A range with no rows, e.g. before the property existed, still gets the full typed
+    # schema, so filtering and aggregating it work the same as on any other frame.
+    if not slices:
+        slices = [_empty_day_frame()]
+
+    query_dtype, page_dtype = _vocabulary(property_url, version)
+    segment_codes, store_codes, segment_dtype, store_dtype = classes
+    raw = pd.concat(slices, ignore_index=True)
+    query_codes = raw["query"].to_numpy()
+    df = pd.DataFrame({
+        "query": pd.Categorical.from_codes(query_codes, dtype=query_dtype),
+        "date": np.repeat(np.array(days, dtype="datetime64[ns]"), lengths),
+        "page": pd.Categorical.from_codes(raw["page"].to_numpy(), dtype=page_dtype),
+        "clicks": raw["clicks"],
+        "impressions": raw["impressions"],
+        "ctr": raw["ctr"],
+        "position": raw["position"],
+        "segment": pd.Categorical.from_codes(segment_codes[query_codes], dtype=segment_dtype),
+        "store": pd.Categorical.from_codes(store_codes[query_codes], dtype=store_dtype),
+    })
+    df.attrs["version"] = dataset_version(
+        property_url, start_date, end_date, version, sorted(versions.items()), manual_version
+    )
+    return df
+
+
+def fetch_gsc_ranges(*ranges):
+    """Sync and assemble several (start, end) ranges against one shared query/page dictionary.
+
+    Each range is built from per-day slices of integer codes, so overlapping ranges share
+    cached days, and all returned frames carry identical categorical dtypes.
+    """
+    service = get_gsc_service()
+    if not service:
+        return [pd.DataFrame() for _ in ranges]
+
+    property_url = get_backend().property_url
+
+    try:
+        refresher = get_refresher()
+        failed = set()
+        for start_date, end_date in ranges:
+            failed.update(sync_gsc_range(property_url, start_date, end_date))
+            refresher.touch(property_url, start_date, end_date)
+        if failed:
+            st.warning(
+                f"{len(failed)} day(s) could not be fetched from Search Console and are missing "
+                f"from the charts ({', '.join(sorted(failed)[:5])}{'…' if len(failed) > 5 else ''}). "
+                "They will be retried on the next load."
+            )
+        # Slices are loaded before the dictionary is read. Ids are only ever appended, so a
+        # vocabulary read afterwards covers every code in them even if a sync stores new
+        # queries in between; read first, it could be shorter than the slices need.
+        day_slices = [_day_slices(property_url, start_date, end_date) for start_date, end_date in ranges]
+        version = warehouse.vocabulary_version(property_url)
+        query_dtype, _ = _vocabulary(property_url, version)
+        manual = load_classifications()
+        classes = apply_manual_classifications(
+            query_dtype, _auto_classes(property_url, version), manual
+        )
+        manual_version = dataset_version(sorted(manual.items(), key=lambda item: item[0]))
+        return [
+            _assemble(property_url, start_date, end_date, slices, version, classes, manual_version)
+            for (start_date, end_date), slices in zip(ranges, day_slices)
+        ]
 
     except Exception as e:
         st.error(f"Data fetch error: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return [pd.DataFrame() for _ in ranges]
+
+
+@cached("gsc.query_activity", st.cache_data(max_entries=8, show_spinner=False))
+def _query_activity(property_url, windows, version):
+    return warehouse.query_activity(property_url, *windows)
+
+
+def query_activity(*windows):
+    """(first_seen, last_seen, [active per window]) arrays indexed by query code, from the
+    warehouse's activity index rather than raw rows; None if the index can't be read."""
+    try:
+        property_url = get_backend().property_url
+        return _query_activity(property_url, windows, warehouse.activity_version(property_url))
+    except Exception as e:
+        st.warning(f"Could not read query activity: {e}")
+        return None
+
+
+def fetch_gsc_data(start_date, end_date):
+    return fetch_gsc_ranges((start_date, end_date))[0]
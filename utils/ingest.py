@@ -0,0 +1,38 @@
+from array import array
+
+
+class ResponseColumns:
+    """Typed column buffers for searchanalytics rows with keys [query, date, page].
+
+    Rows are written straight into per-column buffers as pages arrive, so a large
+    response never becomes one Python dict per row. Every shard covers a single day,
+    which the warehouse records once per partition, so the date key is not kept.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self.pages = []
+        self.clicks = array("q")
+        self.impressions = array("q")
+        self.ctr = array("d")
+        self.position = array("d")
+
+    def __len__(self):
+        return len(self.queries)
+
+    def extend(self, rows):
+        queries, pages = self.queries.append, self.pages.append
+        clicks, impressions = self.clicks.append, self.impressions.append
+        ctr, position = self.ctr.append, self.position.append
+        for row in rows:
+            keys = row["keys"]
+            queries(keys[0])
+            pages(keys[2])
+            clicks(int(row.get("clicks", 0)))
+            impressions(int(row.get("impressions", 0)))
+            ctr(row.get("ctr", 0))
+            position(row.get("position", 0))
+
+    def records(self):
+        """(query, page, clicks, impressions, ctr, position) tuples for bulk inserts."""
+        return zip(self.queries, self.pages, self.clicks, self.impressions, self.ctr, self.position)
@@ -0,0 +1,52 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: one pass over the text finds every pattern it contains.
+
+    Patterns map to one or more labels; `labels(text)` returns the set of labels whose
+    patterns occur anywhere in the text.
+    """
+
+    def __init__(self, patterns):
+        goto = [{}]
+        outputs = [set()]
+        for pattern, labels in patterns.items():
+            state = 0
+            for ch in pattern:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(goto)
+                    goto[state][ch] = nxt
+                    goto.append({})
+                    outputs.append(set())
+                state = nxt
+            outputs[state].update(labels)
+
+        # Breadth-first pass: resolve failure links and fold them into a full
+        # transition table, so matching never has to walk failure chains.
+        fail = [0] * len(goto)
+        delta = [dict(edges) for edges in goto]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            outputs[state] |= outputs[fail[state]]
+            for ch, fallback in delta[fail[state]].items():
+                delta[state].setdefault(ch, fallback)
+            for ch, nxt in goto[state].items():
+                queue.append(nxt)
+                fail[nxt] = delta[fail[state]].get(ch, 0)
+
+        self._delta = delta
+        self._outputs = [frozenset(out) for out in outputs]
+
+    def labels(self, text):
+        delta = self._delta
+        outputs = self._outputs
+        found = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if outputs[state]:
+                found |= outputs[state]
+        return found
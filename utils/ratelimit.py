@@ -0,0 +1,118 @@
+import random
+import socket
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from googleapiclient.errors import HttpError
+
+from utils.telemetry import count
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_CAP_SECONDS = 64.0
+
+# Google API daily quotas reset at midnight Pacific time.
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+
+
+class QuotaExhausted(Exception):
+    pass
+
+
+class TokenBucket:
+    """Client-side request budget: `rate` requests per second with bursts up to `capacity`.
+
+    The refill rate halves on every 429 and creeps back towards `rate` on success, so a
+    large parallel sync settles just under the quota instead of hammering it. An optional
+    `daily_limit` stops requests before the per-day quota is spent.
+    """
+
+    def __init__(self, rate, capacity, daily_limit=None):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 16
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.daily_limit = daily_limit
+        self.day = None
+        self.used_today = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                self._check_daily_limit()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.used_today += 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def _check_daily_limit(self):
+        if self.daily_limit is None:
+            return
+        today = datetime.now(QUOTA_TIMEZONE).date()
+        if today != self.day:
+            self.day = today
+            self.used_today = 0
+        if self.used_today >= self.daily_limit:
+            raise QuotaExhausted(f"Daily budget of {self.daily_limit:,} requests used up")
+
+    def throttle(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _retry_after(error):
+    try:
+        return float(error.resp.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def execute(request, limiter=None, retries=MAX_RETRIES, idempotent=True):
+    """Execute a googleapiclient request under `limiter`, retrying 429/5xx and dropped connections.
+
+    Non-idempotent requests (appends) are only retried on 429, which Google returns
+    before doing any work; a 5xx or dropped connection may already have applied them.
+    """
+    for attempt in range(retries + 1):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            response = request.execute()
+        except HttpError as e:
+            status = e.resp.status
+            if status not in RETRYABLE_STATUS or attempt == retries or (not idempotent and status != 429):
+                raise
+            if status == 429 and limiter is not None:
+                limiter.throttle()
+            count("api_retries", status)
+            delay = _retry_after(e) or backoff_delay(attempt)
+        except (ConnectionError, socket.timeout):
+            if attempt == retries or not idempotent:
+                raise
+            count("api_retries", "connection")
+            delay = backoff_delay(attempt)
+        else:
+            if limiter is not None:
+                limiter.recover()
+            return response
+        time.sleep(delay)
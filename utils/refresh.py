@@ -0,0 +1,52 @@
+import threading
+import time
+
+# How often the background loop wakes up to look for stale days.
+REFRESH_INTERVAL_SECONDS = 300
+
+# A range stays hot, and keeps being refreshed, this long after it was last requested.
+HOT_RANGE_SECONDS = 2 * 3600
+
+
+class Refresher:
+    """Stale-while-revalidate loop: re-syncs recently requested ranges on a daemon thread.
+
+    Interactive reruns keep serving whatever the warehouse already holds; `refresh` is
+    called with each hot key off the request path and is expected to publish its result
+    in one step, so readers see either the old generation or the new one.
+    """
+
+    def __init__(self, refresh, interval=REFRESH_INTERVAL_SECONDS, hot_seconds=HOT_RANGE_SECONDS):
+        self.refresh = refresh
+        self.interval = interval
+        self.hot_seconds = hot_seconds
+        self.lock = threading.Lock()
+        self.ranges = {}
+        self.thread = None
+        self.last_run = None
+        self.last_error = None
+
+    def touch(self, *key):
+        """Mark a range as hot and make sure the loop is running."""
+        with self.lock:
+            self.ranges[key] = time.monotonic()
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="gsc-refresher", daemon=True)
+                self.thread.start()
+
+    def hot_ranges(self):
+        cutoff = time.monotonic() - self.hot_seconds
+        with self.lock:
+            self.ranges = {key: seen for key, seen in self.ranges.items() if seen >= cutoff}
+            return list(self.ranges)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            for key in self.hot_ranges():
+                try:
+                    self.refresh(*key)
+                except Exception as e:
+                    # Keep serving the previous generation; the next pass retries.
+                    self.last_error = e
+            self.last_run = time.time()
@@ -1,37 +1,107 @@
 import streamlit as st
 import pandas as pd
-import json
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import re
+import threading
+import time
+from utils.backends import get_backend
+from utils.ratelimit import TokenBucket, execute
+from utils.telemetry import cached, timed
+
+# The index also follows our own writes, so this only bounds drift from edits made in Sheets.
+INDEX_TTL_SECONDS = 600
+
+# Sheets allows 60 requests per minute per user; the service account is a single user.
+SHEETS_QPS = 1
+SHEETS_BURST = 5
 
 
-@st.cache_resource
 def get_sheets_service():
+    """The Sheets service for the calling thread, from the configured backend."""
     try:
-        credentials_info = json.loads(st.secrets["GOOGLE_CREDENTIALS"])
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_info,
-            scopes=[
-                "https://www.googleapis.com/auth/webmasters.readonly",
-                "https://www.googleapis.com/auth/spreadsheets"
-            ]
-        )
-        service = build("sheets", "v4", credentials=credentials)
-        return service
+        return get_backend().service("sheets", "v4")
     except Exception as e:
         st.error(f"Sheets connection error: {e}")
         return None
 
 
-def load_classifications():
+@st.cache_resource
+def sheets_limiter():
+    return TokenBucket(SHEETS_QPS, SHEETS_BURST)
+
+
+class SheetIndex:
+    """query -> 1-based row number in Sheet1, versioned and kept in step with our writes.
+
+    `version` increases on every write, and load_classifications is cached per version,
+    so a save invalidates exactly one cache entry instead of re-reading on every lookup.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.rows = {}
+        self.version = 0
+        self.loaded_at = None
+
+    def is_stale(self):
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > INDEX_TTL_SECONDS
+
+    def rebuild(self, values, version=None):
+        """Index a column-A read; skipped if a write landed since `version` was taken."""
+        with self.lock:
+            if version is not None and version != self.version:
+                return
+            rows = {}
+            for i, row in enumerate(values):
+                if row:
+                    rows.setdefault(row[0], i + 1)
+            self.rows = rows
+            self.loaded_at = time.monotonic()
+
+    def record_append(self, queries, response):
+        match = re.search(r"![A-Z]+(\d+)", response.get("updates", {}).get("updatedRange", ""))
+        if match:
+            first_row = int(match.group(1))
+            for offset, query in enumerate(queries):
+                self.rows.setdefault(query, first_row + offset)
+        else:
+            self.loaded_at = None
+        self.version += 1
+
+    def record_delete(self, query):
+        self.rows.pop(query, None)
+        self.version += 1
+
+
+@st.cache_resource
+def get_sheet_index():
+    return SheetIndex()
+
+
+def _ensure_index(service, sheet_id):
+    index = get_sheet_index()
+    if index.is_stale():
+        # A write that lands while the column is being read makes this snapshot older than
+        # the index; rebuild() drops it rather than losing that write's rows.
+        version = index.version
+        result = execute(service.spreadsheets().values().get(
+            spreadsheetId=sheet_id,
+            range="Sheet1!A:A"
+        ), sheets_limiter())
+        index.rebuild(result.get("values", []), version)
+    return index
+
+
+@cached("sheets.load_classifications", st.cache_data(ttl=3600, max_entries=4, show_spinner=False))
+def _load_classifications(version):
     try:
         service = get_sheets_service()
-        sheet_id = st.secrets["sheets"]["sheet_id"]
-        result = service.spreadsheets().values().get(
+        sheet_id = get_backend().sheet_id
+        result = execute(service.spreadsheets().values().get(
             spreadsheetId=sheet_id,
             range="Sheet1!A:C"
-        ).execute()
+        ), sheets_limiter())
         values = result.get("values", [])
+        get_sheet_index().rebuild(values, version)
         if len(values) <= 1:
             return {}
         padded = [row + [""] * (3 - len(row)) for row in values[1:]]
@@ -44,90 +114,99 @@ def load_classifications():
         return {}
 
 
+def load_classifications():
+    return _load_classifications(get_sheet_index().version)
+
+
 def save_classification(query, segment, store=None):
+    return save_classifications({query: (segment, store)}) == 1
+
+
+@timed("sheets.save")
+def save_classifications(assignments):
+    """Save {query: (segment, store)} using the row index and at most two writes.
+
+    Existing rows are rewritten in a single batchUpdate; new queries go out in a
+    single append, which also grows the sheet grid when needed.
+    """
+    if not assignments:
+        return 0
     try:
         service = get_sheets_service()
-        sheet_id = st.secrets["sheets"]["sheet_id"]
-        result = service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range="Sheet1!A:C"
-        ).execute()
-        values = result.get("values", [])
-        row_index = None
-        for i, row in enumerate(values):
-            if row and row[0] == query:
-                row_index = i + 1
-                break
-        store_val = store if store else ""
-        new_row = [query, segment, store_val]
-        if row_index:
-            service.spreadsheets().values().update(
-                spreadsheetId=sheet_id,
-                range=f"Sheet1!A{row_index}:C{row_index}",
-                valueInputOption="RAW",
-                body={"values": [new_row]}
-            ).execute()
-        else:
-            service.spreadsheets().values().append(
-                spreadsheetId=sheet_id,
-                range="Sheet1!A:C",
-                valueInputOption="RAW",
-                insertDataOption="INSERT_ROWS",
-                body={"values": [new_row]}
-            ).execute()
-        st.cache_data.clear()
-        return True
+        sheet_id = get_backend().sheet_id
+        index = _ensure_index(service, sheet_id)
+        with index.lock:
+            updates = []
+            appends = []
+            for query, (segment, store) in assignments.items():
+                new_row = [query, segment, store if store else ""]
+                row = index.rows.get(query)
+                if row:
+                    updates.append({"range": f"Sheet1!A{row}:C{row}", "values": [new_row]})
+                else:
+                    appends.append(new_row)
+
+            if updates:
+                execute(service.spreadsheets().values().batchUpdate(
+                    spreadsheetId=sheet_id,
+                    body={"valueInputOption": "RAW", "data": updates}
+                ), sheets_limiter())
+                index.version += 1
+            if appends:
+                response = execute(service.spreadsheets().values().append(
+                    spreadsheetId=sheet_id,
+                    range="Sheet1!A:C",
+                    valueInputOption="RAW",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": appends}
+                ), sheets_limiter(), idempotent=False)
+                index.record_append([row[0] for row in appends], response)
+        return len(updates) + len(appends)
     except Exception as e:
         st.error(f"Could not save classification: {e}")
-        return False
+        return 0
 
 
+@timed("sheets.delete")
 def delete_classification(query):
     try:
         service = get_sheets_service()
-        sheet_id = st.secrets["sheets"]["sheet_id"]
-        result = service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range="Sheet1!A:C"
-        ).execute()
-        values = result.get("values", [])
-        for i, row in enumerate(values):
-            if row and row[0] == query:
-                service.spreadsheets().values().clear(
-                    spreadsheetId=sheet_id,
-                    range=f"Sheet1!A{i+1}:C{i+1}"
-                ).execute()
-                st.cache_data.clear()
-                return True
-        return False
+        sheet_id = get_backend().sheet_id
+        index = _ensure_index(service, sheet_id)
+        with index.lock:
+            row = index.rows.get(query)
+            if not row:
+                return False
+            execute(service.spreadsheets().values().clear(
+                spreadsheetId=sheet_id,
+                range=f"Sheet1!A{row}:C{row}"
+            ), sheets_limiter())
+            index.record_delete(query)
+        return True
     except Exception as e:
         st.error(f"Could not delete classification: {e}")
         return False
 
 
+@timed("sheets.export")
 def export_unclassified_to_sheet(other_df):
     try:
         service = get_sheets_service()
-        sheet_id = st.secrets["sheets"]["sheet_id"]
-        result = service.spreadsheets().values().get(
-            spreadsheetId=sheet_id,
-            range="Sheet1!A:A"
-        ).execute()
-        existing = [row[0] for row in result.get("values", []) if row]
-        new_rows = [
-            [row["query"], "", ""]
-            for _, row in other_df.iterrows()
-            if row["query"] not in existing
-        ]
-        if new_rows:
-            service.spreadsheets().values().append(
-                spreadsheetId=sheet_id,
-                range="Sheet1!A:C",
-                valueInputOption="RAW",
-                insertDataOption="INSERT_ROWS",
-                body={"values": new_rows}
-            ).execute()
-        return len(new_rows)
+        sheet_id = get_backend().sheet_id
+        index = _ensure_index(service, sheet_id)
+        with index.lock:
+            queries = other_df["query"].astype(str)
+            new_queries = queries[~queries.isin(index.rows.keys())].unique().tolist()
+            if new_queries:
+                response = execute(service.spreadsheets().values().append(
+                    spreadsheetId=sheet_id,
+                    range="Sheet1!A:C",
+                    valueInputOption="RAW",
+                    insertDataOption="INSERT_ROWS",
+                    body={"values": [[query, "", ""] for query in new_queries]}
+                ), sheets_limiter(), idempotent=False)
+                index.record_append(new_queries, response)
+        return len(new_queries)
     except Exception as e:
         st.error(f"Export failed: {e}")
         return 0
@@ -0,0 +1,213 @@
+import functools
+import json
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+import numpy as np
+
+# Latency percentiles are computed over each stage's most recent observations.
+ROLLING_WINDOW = 500
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+METRIC_PREFIX = "gsc_dashboard"
+
+
+class Telemetry:
+    """Process-wide stage timings and counters, cheap enough to leave on in production.
+
+    Each stage keeps lifetime count and total seconds plus its last ROLLING_WINDOW
+    durations, from which the percentiles are taken. Counters are keyed by
+    (name, label) so they export directly as labelled Prometheus series.
+    """
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.recent = {}
+        self.totals = {}
+        self.counters = Counter()
+        self.lru = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            recent = self.recent.get(stage)
+            if recent is None:
+                recent = self.recent[stage] = deque(maxlen=self.window)
+            recent.append(seconds)
+            count, total = self.totals.get(stage, (0, 0.0))
+            self.totals[stage] = (count + 1, total + seconds)
+
+    def count(self, name, label=None, n=1):
+        with self.lock:
+            self.counters[(name, label)] += n
+
+    def track_lru(self, name, fn):
+        """Report an lru_cache-wrapped function's own hit/miss statistics under `name`."""
+        with self.lock:
+            self.lru[name] = fn
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.recent.clear()
+            self.totals.clear()
+            self.counters.clear()
+
+    def stages(self):
+        """One summary row per stage, slowest median first."""
+        with self.lock:
+            recent = {stage: np.array(values) for stage, values in self.recent.items()}
+            totals = dict(self.totals)
+        rows = []
+        for stage, values in recent.items():
+            count, total = totals[stage]
+            row = {"stage": stage, "count": count, "total_seconds": total, "last_seconds": float(values[-1])}
+            for q, value in zip(QUANTILES, np.quantile(values, QUANTILES)):
+                row[f"p{round(q * 100)}_seconds"] = float(value)
+            row["max_seconds"] = float(values.max())
+            rows.append(row)
+        return sorted(rows, key=lambda row: row["p50_seconds"], reverse=True)
+
+    def caches(self):
+        """Calls, hits, misses and hit rate per instrumented cache."""
+        with self.lock:
+            calls = {label: n for (name, label), n in self.counters.items() if name == "cache_calls"}
+            misses = {label: n for (name, label), n in self.counters.items() if name == "cache_misses"}
+            lru = dict(self.lru)
+        rows = []
+        for cache in sorted(calls.keys() | misses.keys()):
+            n, miss = calls.get(cache, 0), misses.get(cache, 0)
+            # Clearing a cache mid-call can briefly leave misses ahead of calls.
+            hits = max(n - miss, 0)
+            rows.append({"cache": cache, "calls": n, "hits": hits, "misses": miss,
+                         "hit_rate": hits / n if n else None})
+        for cache, fn in sorted(lru.items()):
+            # Lifetime figures: lru_cache keeps its own and reset() does not clear them.
+            info = fn.cache_info()
+            n = info.hits + info.misses
+            rows.append({"cache": cache, "calls": n, "hits": info.hits, "misses": info.misses,
+                         "hit_rate": info.hits / n if n else None})
+        return rows
+
+    def events(self):
+        """Every other counter, as (name, label, value)."""
+        with self.lock:
+            return sorted(
+                ((name, label, n) for (name, label), n in self.counters.items()
+                 if name not in ("cache_calls", "cache_misses")),
+                key=lambda event: (event[0], "" if event[1] is None else str(event[1]))
+            )
+
+    def snapshot(self):
+        return {
+            "started": self.started,
+            "window": self.window,
+            "stages": self.stages(),
+            "caches": self.caches(),
+            "counters": [{"name": name, "label": label, "value": n} for name, label, n in self.events()],
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = [
+            f"# HELP {METRIC_PREFIX}_stage_seconds Stage latency over the last {self.window} observations.",
+            f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+        ]
+        for row in self.stages():
+            stage = _label_value(row["stage"])
+            for q in QUANTILES:
+                lines.append(f'{METRIC_PREFIX}_stage_seconds{{stage="{stage}",quantile="{q}"}} '
+                             f'{row[f"p{round(q * 100)}_seconds"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {row["total_seconds"]:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {row["count"]}')
+
+        lines += [
+            f"# HELP {METRIC_PREFIX}_cache_requests_total Lookups of memoised functions by result.",
+            f"# TYPE {METRIC_PREFIX}_cache_requests_total counter",
+        ]
+        for row in self.caches():
+            cache = _label_value(row["cache"])
+            lines.append(f'{METRIC_PREFIX}_cache_requests_total{{cache="{cache}",result="hit"}} {row["hits"]}')
+            lines.append(f'{METRIC_PREFIX}_cache_requests_total{{cache="{cache}",result="miss"}} {row["misses"]}')
+
+        previous = None
+        for name, label, n in self.events():
+            if name != previous:
+                lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+                previous = name
+            labels = f'{{label="{_label_value(label)}"}}' if label is not None else ""
+            lines.append(f"{METRIC_PREFIX}_{name}_total{labels} {n}")
+        return "\n".join(lines) + "\n"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_telemetry = Telemetry()
+
+
+def get_telemetry():
+    return _telemetry
+
+
+@contextmanager
+def timer(stage):
+    """Record how long the block takes under `stage`, including when it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _telemetry.observe(stage, time.perf_counter() - start)
+
+
+def count(name, label=None, n=1):
+    _telemetry.count(name, label, n)
+
+
+def track_lru(name, fn):
+    _telemetry.track_lru(name, fn)
+
+
+def timed(stage):
+    """Decorator form of `timer`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        return run
+    return decorate
+
+
+def cached(stage, cache):
+    """Apply a Streamlit cache decorator, counting hits and misses and timing misses under `stage`.
+
+    The function body only runs on a miss, so its duration is the real compute cost;
+    hits are calls minus misses. The wrapped function keeps the original signature,
+    so underscore-prefixed arguments are still left out of the cache key.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def compute(*args, **kwargs):
+            _telemetry.count("cache_misses", stage)
+            with timer(stage):
+                return fn(*args, **kwargs)
+
+        cached_fn = cache(compute)
+
+        @functools.wraps(fn)
+        def lookup(*args, **kwargs):
+            _telemetry.count("cache_calls", stage)
+            return cached_fn(*args, **kwargs)
+
+        lookup.clear = cached_fn.clear
+        return lookup
+    return decorate
@@ -0,0 +1,57 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import google_auth_httplib2
+import httplib2
+import streamlit as st
+from google.oauth2 import service_account
+from googleapiclient.discovery import build
+
+SCOPES = [
+    "https://www.googleapis.com/auth/webmasters.readonly",
+    "https://www.googleapis.com/auth/spreadsheets"
+]
+
+HTTP_TIMEOUT_SECONDS = 120
+
+_thread_local = threading.local()
+
+
+@st.cache_resource
+def get_credentials():
+    """One service-account credentials object for every API client in the process."""
+    credentials_info = json.loads(st.secrets["GOOGLE_CREDENTIALS"])
+    return service_account.Credentials.from_service_account_info(credentials_info, scopes=SCOPES)
+
+
+def authorized_http(credentials):
+    """This thread's authorized HTTP client.
+
+    httplib2 clients are not thread-safe, so each thread gets its own; it keeps its
+    TLS connections open, so later calls on the same thread skip the handshake.
+    """
+    http = getattr(_thread_local, "http", None)
+    if http is None or http.credentials is not credentials:
+        http = google_auth_httplib2.AuthorizedHttp(
+            credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+        )
+        _thread_local.http = http
+        _thread_local.services = {}
+    return http
+
+
+def thread_service(name, version, credentials=None):
+    """A googleapiclient service bound to this thread's HTTP client, built once per thread."""
+    http = authorized_http(credentials or get_credentials())
+    service = _thread_local.services.get((name, version))
+    if service is None:
+        service = build(name, version, http=http, cache_discovery=False)
+        _thread_local.services[(name, version)] = service
+    return service
+
+
+@st.cache_resource
+def get_executor(max_workers):
+    """Long-lived worker pool, so worker threads and their open connections survive between syncs."""
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="google-api")
@@ -0,0 +1,319 @@
+import os
+import re
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+WAREHOUSE_DIR = os.environ.get("GSC_WAREHOUSE_DIR", ".warehouse")
+
+# GSC only marks a day as final a few days after it ends; anything newer is re-synced.
+FINAL_LAG_DAYS = 3
+
+# An empty day is re-fetched for this long past FINAL_LAG_DAYS in case GSC is late to
+# finalise it; after that it is settled (past retention, before the property existed, no traffic).
+EMPTY_GRACE_DAYS = 4
+
+# How long a non-final day is served from the warehouse before it is fetched again.
+RECENT_TTL_SECONDS = 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS queries (
+    id INTEGER PRIMARY KEY,
+    query TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS pages (
+    id INTEGER PRIMARY KEY,
+    page TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS rows (
+    day TEXT NOT NULL,
+    query_id INTEGER NOT NULL,
+    page_id INTEGER NOT NULL,
+    clicks INTEGER NOT NULL,
+    impressions INTEGER NOT NULL,
+    ctr REAL NOT NULL,
+    position REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rows_day ON rows (day);
+CREATE TABLE IF NOT EXISTS days (
+    day TEXT PRIMARY KEY,
+    final INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    synced_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS query_activity (
+    query_id INTEGER PRIMARY KEY,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    active BLOB NOT NULL
+);
+"""
+
+# Bumped when a schema change needs existing warehouses backfilled (PRAGMA user_version).
+SCHEMA_VERSION = 1
+
+
+def warehouse_path(property_url):
+    name = re.sub(r"[^a-z0-9]+", "_", property_url.lower()).strip("_")
+    return os.path.join(WAREHOUSE_DIR, f"{name}.sqlite3")
+
+
+def connect(property_url):
+    path = warehouse_path(property_url)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        with conn:
+            rebuild_query_activity(conn)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return conn
+
+
+def is_final(day, today=None, lag=FINAL_LAG_DAYS):
+    today = today or date.today()
+    return date.fromisoformat(day) <= today - timedelta(days=lag)
+
+
+def days_in_range(start_date, end_date):
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    return [(start + timedelta(days=i)).isoformat() for i in range((end - start).days + 1)]
+
+
+def day_versions(property_url, start_date, end_date):
+    """Map each stored day in the range to (final, synced_at); synced_at doubles as a version."""
+    with closing(connect(property_url)) as conn:
+        return {
+            day: (bool(final), synced_at)
+            for day, final, synced_at in conn.execute(
+                "SELECT day, final, synced_at FROM days WHERE day BETWEEN ? AND ?",
+                (start_date, end_date)
+            )
+        }
+
+
+def missing_days(property_url, start_date, end_date, max_age=RECENT_TTL_SECONDS):
+    """Days in the range that are not stored, or are non-final and older than `max_age` seconds.
+
+    With `max_age=None` only days that are not stored at all count as missing.
+    """
+    versions = day_versions(property_url, start_date, end_date)
+    cutoff = None
+    if max_age is not None:
+        cutoff = (datetime.now() - timedelta(seconds=max_age)).isoformat(timespec="seconds")
+    return [
+        day for day in days_in_range(start_date, end_date)
+        if day not in versions
+        or (cutoff is not None and not versions[day][0] and versions[day][1] < cutoff)
+    ]
+
+
+def store_day(property_url, day, columns):
+    """Replace one day's partition with a shard's ResponseColumns and record whether it is final.
+
+    A day is final once it is FINAL_LAG_DAYS old and the fetch returned rows for it, or
+    once it is EMPTY_GRACE_DAYS older than that regardless.
+    """
+    store_days(property_url, {day: columns})
+
+
+def store_days(property_url, columns_by_day):
+    """Replace several days in one transaction, so readers see all of them change at once."""
+    with closing(connect(property_url)) as conn, conn:
+        for day, columns in columns_by_day.items():
+            _replace_day(conn, day, columns)
+
+
+def _replace_day(conn, day, columns):
+    conn.execute(
+        "CREATE TEMP TABLE IF NOT EXISTS staging "
+        "(query TEXT, page TEXT, clicks INTEGER, impressions INTEGER, ctr REAL, position REAL)"
+    )
+    conn.execute("DELETE FROM staging")
+    conn.executemany("INSERT INTO staging VALUES (?, ?, ?, ?, ?, ?)", columns.records())
+    conn.execute("INSERT OR IGNORE INTO queries (query) SELECT DISTINCT query FROM staging")
+    conn.execute("INSERT OR IGNORE INTO pages (page) SELECT DISTINCT page FROM staging")
+    before = _day_query_ids(conn, day)
+    conn.execute("DELETE FROM rows WHERE day = ?", (day,))
+    conn.execute(
+        """
+        INSERT INTO rows
+        SELECT ?, q.id, p.id, s.clicks, s.impressions, s.ctr, s.position
+        FROM staging s
+        JOIN queries q ON q.query = s.query
+        JOIN pages p ON p.page = s.page
+        """,
+        (day,)
+    )
+    after = _day_query_ids(conn, day)
+    update_query_activity(conn, day, added=after - before, removed=before - after)
+    # A recent empty fetch usually means GSC hasn't finalised the day yet, so it stays
+    # non-final and is fetched again rather than staying empty for good.
+    final = is_final(day) if len(columns) else is_final(day, lag=FINAL_LAG_DAYS + EMPTY_GRACE_DAYS)
+    conn.execute(
+        "INSERT OR REPLACE INTO days VALUES (?, ?, ?, ?)",
+        (day, int(final), len(columns), datetime.now().isoformat(timespec="seconds"))
+    )
+
+
+def _day_query_ids(conn, day):
+    return {query_id for (query_id,) in conn.execute(
+        "SELECT DISTINCT query_id FROM rows WHERE day = ?", (day,)
+    )}
+
+
+def _activity_record(query_id, first, mask):
+    """Normalise a mask so bit 0 is the first active day, or None when nothing is left."""
+    if not mask:
+        return None
+    shift = (mask & -mask).bit_length() - 1
+    mask >>= shift
+    first += shift
+    last = first + mask.bit_length() - 1
+    return (
+        query_id,
+        date.fromordinal(first).isoformat(),
+        date.fromordinal(last).isoformat(),
+        mask.to_bytes((mask.bit_length() + 7) // 8, "little"),
+    )
+
+
+def update_query_activity(conn, day, added, removed):
+    """Set or clear one day's bit for the queries that appeared in or dropped out of it.
+
+    Each query keeps first_seen, last_seen and an active-day bitmap where bit k is
+    first_seen + k days, so any window can be tested without touching `rows`.
+    """
+    touched = added | removed
+    if not touched:
+        return
+    day_ord = date.fromisoformat(day).toordinal()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS touched (query_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM touched")
+    conn.executemany("INSERT INTO touched VALUES (?)", ((query_id,) for query_id in touched))
+    existing = {
+        query_id: (date.fromisoformat(first).toordinal(), int.from_bytes(active, "little"))
+        for query_id, first, active in conn.execute(
+            "SELECT a.query_id, a.first_seen, a.active FROM query_activity a JOIN touched USING (query_id)"
+        )
+    }
+
+    upserts = []
+    deletes = []
+    for query_id in touched:
+        first, mask = existing.get(query_id, (day_ord, 0))
+        if day_ord < first:
+            mask <<= first - day_ord
+            first = day_ord
+        if query_id in added:
+            mask |= 1 << (day_ord - first)
+        else:
+            mask &= ~(1 << (day_ord - first))
+        record = _activity_record(query_id, first, mask)
+        if record:
+            upserts.append(record)
+        elif query_id in existing:
+            deletes.append((query_id,))
+    conn.executemany("INSERT OR REPLACE INTO query_activity VALUES (?, ?, ?, ?)", upserts)
+    conn.executemany("DELETE FROM query_activity WHERE query_id = ?", deletes)
+
+
+def rebuild_query_activity(conn):
+    """Recompute the whole activity index from `rows`; used to backfill older warehouses."""
+    days_by_query = {}
+    for query_id, day in conn.execute("SELECT DISTINCT query_id, day FROM rows"):
+        days_by_query.setdefault(query_id, []).append(date.fromisoformat(day).toordinal())
+    records = []
+    for query_id, ordinals in days_by_query.items():
+        first = min(ordinals)
+        mask = 0
+        for ordinal in ordinals:
+            mask |= 1 << (ordinal - first)
+        records.append(_activity_record(query_id, first, mask))
+    conn.execute("DELETE FROM query_activity")
+    conn.executemany("INSERT INTO query_activity VALUES (?, ?, ?, ?)", records)
+
+
+def activity_version(property_url):
+    """(days stored, latest sync); changes whenever store_day touches the activity index."""
+    with closing(connect(property_url)) as conn:
+        return conn.execute("SELECT COUNT(*), MAX(synced_at) FROM days").fetchone()
+
+
+def query_activity(property_url, *windows):
+    """First/last-seen dates and per-window activity flags, indexed by query code (id - 1).
+
+    Returns (first_seen, last_seen, [active for each (start, end) window]). A query whose
+    first or last active day falls inside a window is active there by definition; only
+    queries spanning the whole window need their bitmap checked.
+    """
+    with closing(connect(property_url)) as conn:
+        size = conn.execute("SELECT COUNT(*) FROM queries").fetchone()[0]
+        records = conn.execute(
+            "SELECT query_id, first_seen, last_seen, active FROM query_activity"
+        ).fetchall()
+
+    first_seen = np.full(size, np.datetime64("NaT"), dtype="datetime64[D]")
+    last_seen = first_seen.copy()
+    flags = [np.zeros(size, dtype=bool) for _ in windows]
+    if not records:
+        return first_seen, last_seen, flags
+
+    ids, firsts, lasts, bitmaps = zip(*records)
+    codes = np.array(ids, dtype="int64") - 1
+    firsts = np.array(firsts, dtype="datetime64[D]")
+    lasts = np.array(lasts, dtype="datetime64[D]")
+    first_seen[codes] = firsts
+    last_seen[codes] = lasts
+
+    for active, (start_date, end_date) in zip(flags, windows):
+        lo = np.datetime64(start_date, "D")
+        hi = np.datetime64(end_date, "D")
+        endpoint = ((firsts >= lo) & (firsts <= hi)) | ((lasts >= lo) & (lasts <= hi))
+        active[codes[endpoint]] = True
+        width = int((hi - lo).astype(int)) + 1
+        for i in np.flatnonzero((firsts < lo) & (lasts > hi)):
+            offset = int((lo - firsts[i]).astype(int))
+            if (int.from_bytes(bitmaps[i], "little") >> offset) & ((1 << width) - 1):
+                active[codes[i]] = True
+    return first_seen, last_seen, flags
+
+
+def load_day(property_url, day):
+    """One day's rows as stored: dictionary ids, ctr as a fraction and unrounded position."""
+    with closing(connect(property_url)) as conn:
+        return pd.read_sql_query(
+            """
+            SELECT query_id, page_id, clicks, impressions, ctr, position
+            FROM rows
+            WHERE day = ?
+            """,
+            conn,
+            params=(day,)
+        )
+
+
+def vocabulary_version(property_url):
+    """(query count, page count); it only changes when a sync adds new strings."""
+    with closing(connect(property_url)) as conn:
+        return conn.execute(
+            "SELECT (SELECT COUNT(*) FROM queries), (SELECT COUNT(*) FROM pages)"
+        ).fetchone()
+
+
+def load_vocabulary(property_url):
+    """Query and page strings ordered by id.
+
+    Rows are never deleted from the dictionary tables, so ids are dense and `id - 1`
+    is a stable position that stays valid as new strings are appended.
+    """
+    with closing(connect(property_url)) as conn:
+        queries = [query for (query,) in conn.execute("SELECT query FROM queries ORDER BY id")]
+        pages = [page for (page,) in conn.execute("SELECT page FROM pages ORDER BY id")]
+    return queries, pages
@@ -1,12 +1,16 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+from datetime import datetime
 from utils.classify import ALL_SEGMENTS, STORE_LOCATIONS
+from utils.gsc import get_refresher
 from utils.sheets import (
     load_classifications,
-    save_classification,
+    save_classifications,
     delete_classification,
     export_unclassified_to_sheet
 )
+from utils.telemetry import get_telemetry
 
 
 def render(df):
@@ -15,10 +19,11 @@ def render(df):
 
     manual_classifications = load_classifications()
 
-    tab1, tab2, tab3 = st.tabs([
+    tab1, tab2, tab3, tab4 = st.tabs([
         "Unclassified Keywords",
         "Reclassify Any Keyword",
-        "All Manual Classifications"
+        "All Manual Classifications",
+        "Diagnostics"
     ])
 
     # ── TAB 1: UNCLASSIFIED ──────────────────────────────────
@@ -26,7 +31,7 @@ def render(df):
         st.markdown('<div class="section-header">Unclassified Keywords</div>', unsafe_allow_html=True)
         st.caption("Assign segments below, or export to Google Sheets for bulk classification.")
 
-        other_df = df[df["segment"] == "Other"].groupby("query").agg(
+        other_df = df[df["segment"] == "Other"].groupby("query", observed=True).agg(
             Clicks=("clicks", "sum"),
             Impressions=("impressions", "sum"),
             Position=("position", "mean")
@@ -100,12 +105,10 @@ def render(df):
             with col2:
                 if st.button("💾 Save All", key="save_all_unclassified", type="primary"):
                     if assignments:
-                        saved = 0
-                        for q, seg in assignments.items():
-                            store_val = store_assignments.get(q)
-                            store_val = store_val if store_val != "None" else None
-                            if save_classification(q, seg, store_val):
-                                saved += 1
+                        saved = save_classifications({
+                            q: (seg, store_assignments.get(q) if store_assignments.get(q) != "None" else None)
+                            for q, seg in assignments.items()
+                        })
                         st.success(f"✓ Saved {saved} classifications")
                         st.rerun()
                     else:
@@ -118,16 +121,14 @@ def render(df):
 
         search_term = st.text_input("Filter by keyword", placeholder="Leave blank to show all...")
 
-        all_q = df.groupby("query").agg(
+        all_q = df.groupby("query", observed=True).agg(
             Clicks=("clicks", "sum"),
             Impressions=("impressions", "sum"),
             Position=("position", "mean"),
             Current_Segment=("segment", "first")
         ).reset_index().sort_values("Impressions", ascending=False)
         all_q["Position"] = all_q["Position"].round(1)
-        all_q["Manual"] = all_q["query"].apply(
-            lambda q: "✓" if q in manual_classifications else ""
-        )
+        all_q["Manual"] = np.where(all_q["query"].isin(manual_classifications.keys()), "✓", "")
 
         if search_term:
             all_q = all_q[all_q["query"].str.contains(search_term, case=False)]
@@ -185,12 +186,10 @@ def render(df):
         with col2:
             if st.button("💾 Save All", key="save_all_reclassify", type="primary"):
                 if rc_assignments:
-                    saved = 0
-                    for q, seg in rc_assignments.items():
-                        store_val = rc_stores.get(q)
-                        store_val = store_val if store_val != "None" else None
-                        if save_classification(q, seg, store_val):
-                            saved += 1
+                    saved = save_classifications({
+                        q: (seg, rc_stores.get(q) if rc_stores.get(q) != "None" else None)
+                        for q, seg in rc_assignments.items()
+                    })
                     st.success(f"✓ Saved {saved} reclassifications")
                     st.rerun()
                 else:
@@ -234,3 +233,84 @@ def render(df):
                 file_name="query_classifications.csv",
                 mime="text/csv"
             )
+
+    # ── TAB 4: DIAGNOSTICS ───────────────────────────────────
+    with tab4:
+        render_diagnostics()
+
+
+def render_diagnostics():
+    telemetry = get_telemetry()
+    started = datetime.fromtimestamp(telemetry.started).strftime("%Y-%m-%d %H:%M")
+    st.caption(
+        f"Shared by every session on this server since {started}. Percentiles cover each "
+        f"stage's last {telemetry.window} runs; cached stages are only timed on a miss."
+    )
+
+    st.markdown('<div class="section-header">Stage Timings</div>', unsafe_allow_html=True)
+    stages = pd.DataFrame(telemetry.stages())
+    if stages.empty:
+        st.info("Nothing recorded yet.")
+    else:
+        stages_df = pd.DataFrame({
+            "Stage": stages["stage"],
+            "Runs": stages["count"],
+            "p50 (ms)": (stages["p50_seconds"] * 1000).round(1),
+            "p90 (ms)": (stages["p90_seconds"] * 1000).round(1),
+            "p99 (ms)": (stages["p99_seconds"] * 1000).round(1),
+            "Max (ms)": (stages["max_seconds"] * 1000).round(1),
+            "Last (ms)": (stages["last_seconds"] * 1000).round(1),
+            "Total (s)": stages["total_seconds"].round(2),
+        })
+        st.dataframe(stages_df, use_container_width=True, hide_index=True)
+
+    st.markdown('<div class="section-header">Caches</div>', unsafe_allow_html=True)
+    caches = pd.DataFrame(telemetry.caches())
+    if not caches.empty:
+        caches_df = pd.DataFrame({
+            "Cache": caches["cache"],
+            "Calls": caches["calls"],
+            "Hits": caches["hits"],
+            "Misses": caches["misses"],
+            "Hit Rate %": (caches["hit_rate"].astype(float) * 100).round(1),
+        })
+        st.dataframe(caches_df, use_container_width=True, hide_index=True)
+
+    events = telemetry.events()
+    if events:
+        st.markdown('<div class="section-header">Counters</div>', unsafe_allow_html=True)
+        st.dataframe(pd.DataFrame(
+            [{"Counter": name, "Label": "—" if label is None else str(label), "Value": n}
+             for name, label, n in events]
+        ), use_container_width=True, hide_index=True)
+
+    st.markdown('<div class="section-header">Background Refresh</div>', unsafe_allow_html=True)
+    refresher = get_refresher()
+    last_run = (
+        datetime.fromtimestamp(refresher.last_run).strftime("%Y-%m-%d %H:%M:%S")
+        if refresher.last_run else "not yet"
+    )
+    st.markdown(f"**Last pass:** {last_run} &nbsp;·&nbsp; **Hot ranges:** {len(refresher.hot_ranges())}")
+    if refresher.last_error is not None:
+        st.warning(f"Last refresh error: {refresher.last_error}")
+
+    st.markdown("---")
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        st.download_button(
+            label="⬇️ Export JSON",
+            data=telemetry.to_json(),
+            file_name="gsc_dashboard_metrics.json",
+            mime="application/json"
+        )
+    with col2:
+        st.download_button(
+            label="⬇️ Export Prometheus",
+            data=telemetry.to_prometheus(),
+            file_name="gsc_dashboard_metrics.prom",
+            mime="text/plain"
+        )
+    with col3:
+        if st.button("Reset counters", key="reset_telemetry"):
+            telemetry.reset()
+            st.rerun()
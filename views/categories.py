@@ -1,11 +1,8 @@
 import streamlit as st
 import plotly.graph_objects as go
-
-
-def calc_change(curr, prev):
-    if prev == 0:
-        return 100.0
-    return round(((curr - prev) / prev) * 100, 1)
+from utils.cube import period_rollup, rollup, totals
+from utils.deltas import arrow, calc_change
+from utils.telemetry import cached
 
 
 CATEGORY_SEGMENTS = [
@@ -29,22 +26,6 @@ SEGMENT_COLORS = {
 }
 
 
-def get_period_data(df, granularity):
-    df = df.copy()
-    if granularity == "Day":
-        df["period"] = df["date"]
-    elif granularity == "Week":
-        df["period"] = df["date"].dt.to_period("W").dt.start_time
-    else:
-        df["period"] = df["date"].dt.to_period("M").dt.start_time
-    return df.groupby("period").agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-        CTR=("ctr", "mean"),
-        Position=("position", "mean")
-    ).reset_index()
-
-
 def chart_layout(height=300):
     return dict(
         height=height,
@@ -80,18 +61,50 @@ def chart_layout(height=300):
 def scorecard(label, value, prev_value, format_fn=lambda x: f"{x:,}"):
     change = calc_change(value, prev_value)
     delta_class = "delta-up" if change >= 0 else "delta-down"
-    arrow = "▲" if change >= 0 else "▼"
     st.markdown(f"""
     <div class="metric-card">
         <div class="metric-label">{label}</div>
         <div class="metric-value">{format_fn(value)}</div>
-        <div class="metric-delta {delta_class}">{arrow} {abs(change)}% vs prev</div>
+        <div class="metric-delta {delta_class}">{arrow(change)} {abs(change)}% vs prev</div>
         <div class="metric-prev">prev: {format_fn(prev_value)}</div>
     </div>
     """, unsafe_allow_html=True)
 
 
-def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
+# Memoised per cube token and selection; `selected` is passed as a sorted tuple.
+@cached("categories.category_series", st.cache_data(max_entries=16, show_spinner=False))
+def category_series(token, selected, granularity, _cube):
+    agg = period_rollup(_cube.days[_cube.days["segment"].isin(selected)], granularity)
+    agg["CTR"] = agg["CTR"].round(2)
+    agg["Position"] = agg["Position"].round(1)
+    return agg
+
+
+@cached("categories.top_queries", st.cache_data(max_entries=16, show_spinner=False))
+def top_queries(token, selected, _cube):
+    top_q = _cube.queries[_cube.queries["segment"].isin(selected)][
+        ["query", "segment", "clicks", "impressions", "position", "ctr"]
+    ].rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "position": "Position", "ctr": "CTR"
+    }).sort_values("Clicks", ascending=False).head(50)
+    top_q["Position"] = top_q["Position"].round(1)
+    top_q["CTR"] = top_q["CTR"].round(2)
+    return top_q
+
+
+@cached("categories.store_breakdown", st.cache_data(max_entries=16, show_spinner=False))
+def store_breakdown(token, selected, _cube):
+    store_df = _cube.stores[_cube.stores["segment"].isin(selected)]
+    if store_df.empty:
+        return None
+    store_agg = rollup(store_df, ["store"]).rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "position": "Position"
+    })[["store", "Clicks", "Impressions", "Position"]].sort_values("Clicks", ascending=False)
+    store_agg["Position"] = store_agg["Position"].round(1)
+    return store_agg
+
+
+def render(cube, cube_prev, start_str, end_str, period_days):
     st.markdown("""
     <div class="page-title">Search <span class="pink">Categories</span></div>
     <div class="page-subtitle">Select one or more categories to explore combined performance</div>
@@ -124,24 +137,27 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
             st.rerun()
 
     selected = st.session_state.selected_categories
-    df_sel = df_filtered[df_filtered["segment"].isin(selected)]
-    df_prev_sel = df_prev_filtered[df_prev_filtered["segment"].isin(selected)]
+    selected_key = tuple(sorted(selected))
+    seg_sel = cube.segments[cube.segments["segment"].isin(selected)]
+    seg_prev_sel = cube_prev.segments[cube_prev.segments["segment"].isin(selected)]
 
-    if df_sel.empty:
+    if seg_sel.empty:
         st.info("No data for selected categories.")
         return
 
     st.markdown('<hr class="dot-divider">', unsafe_allow_html=True)
 
     # ── SUMMARY CARDS ────────────────────────────────────────
-    curr_clicks = df_sel["clicks"].sum()
-    curr_imp = df_sel["impressions"].sum()
+    curr = totals(seg_sel)
+    prev = totals(seg_prev_sel)
+    curr_clicks = curr["clicks"]
+    curr_imp = curr["impressions"]
     curr_ctr = round(curr_clicks / curr_imp * 100, 2) if curr_imp > 0 else 0
-    curr_pos = round(df_sel["position"].mean(), 1)
-    prev_clicks = df_prev_sel["clicks"].sum()
-    prev_imp = df_prev_sel["impressions"].sum()
+    curr_pos = round(curr["position"], 1)
+    prev_clicks = prev["clicks"]
+    prev_imp = prev["impressions"]
     prev_ctr = round(prev_clicks / prev_imp * 100, 2) if prev_imp > 0 else 0
-    prev_pos = round(df_prev_sel["position"].mean(), 1)
+    prev_pos = round(prev["position"], 1)
 
     c1, c2, c3, c4 = st.columns(4)
     with c1: scorecard("Clicks", curr_clicks, prev_clicks)
@@ -165,9 +181,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
     with ctrl2:
         granularity = st.selectbox("Granularity", ["Day", "Week", "Month"], index=1, key="cat_gran")
 
-    agg = get_period_data(df_sel, granularity)
-    agg["CTR"] = agg["CTR"].round(2)
-    agg["Position"] = agg["Position"].round(1)
+    agg = category_series(cube.token, selected_key, granularity, cube)
 
     fig = go.Figure()
 
@@ -224,14 +238,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
     # ── TOP QUERIES ──────────────────────────────────────────
     st.markdown('<div class="section-header">Top Queries</div>', unsafe_allow_html=True)
 
-    top_q = df_sel.groupby(["query", "segment"]).agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-        Position=("position", "mean"),
-        CTR=("ctr", "mean")
-    ).reset_index().sort_values("Clicks", ascending=False).head(50)
-    top_q["Position"] = top_q["Position"].round(1)
-    top_q["CTR"] = top_q["CTR"].round(2)
+    top_q = top_queries(cube.token, selected_key, cube)
     st.dataframe(top_q, use_container_width=True, hide_index=True)
 
     # ── STORE BREAKDOWN ──────────────────────────────────────
@@ -239,15 +246,8 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
     if any(s in selected for s in store_segs):
         st.markdown('<hr class="dot-divider">', unsafe_allow_html=True)
         st.markdown('<div class="section-header">By Store Location</div>', unsafe_allow_html=True)
-        store_df = df_sel[df_sel["store"].notna()]
-        if not store_df.empty:
-            store_agg = store_df.groupby("store").agg(
-                Clicks=("clicks", "sum"),
-                Impressions=("impressions", "sum"),
-                Position=("position", "mean")
-            ).reset_index().sort_values("Clicks", ascending=False)
-            store_agg["Position"] = store_agg["Position"].round(1)
-
+        store_agg = store_breakdown(cube.token, selected_key, cube)
+        if store_agg is not None:
             fig2 = go.Figure(go.Bar(
                 x=store_agg["store"],
                 y=store_agg["Clicks"],
@@ -1,43 +1,84 @@
 import streamlit as st
+import numpy as np
+import pandas as pd
+from utils.cube import query_codes
+from utils.gsc import query_activity
+from utils.telemetry import cached
 
 
-def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
+def vocabulary_codes(queries):
+    """Warehouse query codes (id - 1) for a per-query rollup, or None if it isn't vocabulary-coded."""
+    column = queries["query"]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    if column.empty:
+        return np.array([], dtype="int64")
+    return None
+
+
+@cached("new_lost.new_and_lost", st.cache_data(max_entries=8, show_spinner=False))
+def new_and_lost(token, prev_token, window, prev_window, _cube, _cube_prev):
+    """New and lost queries, decided by the warehouse activity index for the two windows.
+
+    Segment and store are per-query, so testing the filtered rollups against the
+    unfiltered index gives the same sets as diffing the two filtered periods. Without
+    the index it falls back to diffing the rollups' integer query ids.
+    """
+    curr_q, prev_q = _cube.queries, _cube_prev.queries
+    curr_codes, prev_codes = vocabulary_codes(curr_q), vocabulary_codes(prev_q)
+    activity = None
+    if curr_codes is not None and prev_codes is not None:
+        activity = query_activity(window, prev_window)
+
+    if activity is not None:
+        first_seen, last_seen, (active, active_prev) = activity
+        is_new = ~active_prev[curr_codes]
+        is_lost = ~active[prev_codes]
+    else:
+        curr_codes, prev_codes = query_codes(curr_q, prev_q)
+        is_new = np.isin(curr_codes, np.setdiff1d(curr_codes, prev_codes), assume_unique=True)
+        is_lost = np.isin(prev_codes, np.setdiff1d(prev_codes, curr_codes), assume_unique=True)
+
+    new_df = curr_q[is_new][
+        ["query", "segment", "clicks", "impressions", "position"]
+    ].rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "position": "Position"
+    })
+    new_df["Position"] = new_df["Position"].round(1)
+    if activity is not None:
+        new_df["First Seen"] = first_seen[curr_codes[is_new]]
+    new_df = new_df.sort_values("Clicks", ascending=False)
+
+    lost_df = prev_q[is_lost][
+        ["query", "segment", "clicks", "impressions", "position"]
+    ]
+    lost_df["position"] = lost_df["position"].round(1)
+    lost_df.columns = ["Query", "Segment", "Clicks (Last Period)", "Impressions (Last Period)", "Position (Last Period)"]
+    if activity is not None:
+        lost_df["Last Seen"] = last_seen[prev_codes[is_lost]]
+    lost_df = lost_df.sort_values("Clicks (Last Period)", ascending=False)
+    return new_df, lost_df
+
+
+def render(cube, cube_prev, start_str, end_str, period_days, prev_start_str, prev_end_str):
     st.markdown("""
     <div class="page-title">New <span class="pink">&amp; Lost</span> Keywords</div>
     """, unsafe_allow_html=True)
     st.markdown(f'<div class="page-subtitle">{start_str} → {end_str} &nbsp;·&nbsp; vs previous {period_days} days</div>', unsafe_allow_html=True)
 
-    curr_queries = set(df_filtered["query"].unique())
-    prev_queries = set(df_prev_filtered["query"].unique())
-    new_queries = curr_queries - prev_queries
-    lost_queries = prev_queries - curr_queries
+    new_df, lost_df = new_and_lost(
+        cube.token, cube_prev.token, (start_str, end_str), (prev_start_str, prev_end_str), cube, cube_prev
+    )
 
     tab1, tab2 = st.tabs([
-        f"New Keywords ({len(new_queries):,})",
-        f"Lost Keywords ({len(lost_queries):,})"
+        f"New Keywords ({len(new_df):,})",
+        f"Lost Keywords ({len(lost_df):,})"
     ])
 
     with tab1:
         st.caption("Queries appearing this period that had zero impressions previously")
-        new_df = df_filtered[df_filtered["query"].isin(new_queries)].groupby(
-            ["query", "segment"]
-        ).agg(
-            Clicks=("clicks", "sum"),
-            Impressions=("impressions", "sum"),
-            Position=("position", "mean")
-        ).reset_index().sort_values("Clicks", ascending=False)
-        new_df["Position"] = new_df["Position"].round(1)
         st.dataframe(new_df, use_container_width=True, hide_index=True)
 
     with tab2:
         st.caption("Queries that had impressions previously but have disappeared this period")
-        lost_df = df_prev_filtered[df_prev_filtered["query"].isin(lost_queries)].groupby(
-            ["query", "segment"]
-        ).agg(
-            Clicks=("clicks", "sum"),
-            Impressions=("impressions", "sum"),
-            Position=("position", "mean")
-        ).reset_index().sort_values("Clicks", ascending=False)
-        lost_df["Position"] = lost_df["Position"].round(1)
-        lost_df.columns = ["Query", "Segment", "Clicks (Last Period)", "Impressions (Last Period)", "Position (Last Period)"]
         st.dataframe(lost_df, use_container_width=True, hide_index=True)
@@ -1,42 +1,78 @@
 import streamlit as st
+import numpy as np
+import pandas as pd
 import plotly.graph_objects as go
-
-
-def calc_change(curr, prev):
-    if prev == 0:
-        return 100.0
-    return round(((curr - prev) / prev) * 100, 1)
+from utils.cube import period_rollup, totals
+from utils.deltas import arrow, calc_change, pct_change
+from utils.telemetry import cached
 
 
 def scorecard(label, value, prev_value, format_fn=lambda x: f"{x:,}"):
     change = calc_change(value, prev_value)
     delta_class = "delta-up" if change >= 0 else "delta-down"
-    arrow = "▲" if change >= 0 else "▼"
     prev_fmt = format_fn(prev_value)
     st.markdown(f"""
     <div class="metric-card">
         <div class="metric-label">{label}</div>
         <div class="metric-value">{format_fn(value)}</div>
-        <div class="metric-delta {delta_class}">{arrow} {abs(change)}% vs prev period</div>
+        <div class="metric-delta {delta_class}">{arrow(change)} {abs(change)}% vs prev period</div>
         <div class="metric-prev">prev: {prev_fmt}</div>
     </div>
     """, unsafe_allow_html=True)
 
 
-def get_period_data(df, granularity):
-    df = df.copy()
-    if granularity == "Day":
-        df["period"] = df["date"]
-    elif granularity == "Week":
-        df["period"] = df["date"].dt.to_period("W").dt.start_time
-    else:
-        df["period"] = df["date"].dt.to_period("M").dt.start_time
-    return df.groupby("period").agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-        CTR=("ctr", "mean"),
-        Position=("position", "mean")
-    ).reset_index()
+# (label, range label, low, high); lows ascending, ranges closed and non-overlapping.
+BUCKETS = [
+    ("Top 3", "#1–3", 1, 3),
+    ("Top 10", "#4–10", 4, 10),
+    ("Top 20", "#11–20", 11, 20),
+    ("Rest", "#21+", 21, 999),
+]
+
+
+def bucket_counts(df, edges):
+    """Distinct queries with at least one row in each closed [low, high] position bucket.
+
+    One pass for any number of buckets: each row is binned with searchsorted on the
+    bucket lows, rows falling in the gaps between buckets are dropped, and the distinct
+    (query, bucket) pairs are counted with bincount. `edges` must be sorted and disjoint.
+    """
+    lows = np.array([low for low, _ in edges], dtype="float64")
+    highs = np.array([high for _, high in edges], dtype="float64")
+    if df.empty:
+        return np.zeros(len(edges), dtype="int64")
+    position = df["position"].to_numpy(dtype="float64")
+    bucket = np.searchsorted(lows, position, side="right") - 1
+    inside = bucket >= 0
+    inside[inside] = position[inside] <= highs[bucket[inside]]
+    codes, _ = pd.factorize(df["query"])
+    pairs = np.unique(codes[inside].astype("int64") * len(edges) + bucket[inside])
+    return np.bincount(pairs % len(edges), minlength=len(edges))
+
+
+# View computations are memoised on the cube tokens; the cubes themselves are not hashed.
+@cached("overview.performance_series", st.cache_data(max_entries=16, show_spinner=False))
+def performance_series(token, granularity, _cube):
+    agg = period_rollup(_cube.days, granularity)
+    agg["CTR"] = agg["CTR"].round(2)
+    agg["Position"] = agg["Position"].round(1)
+    return agg
+
+
+@cached("overview.keyword_distribution", st.cache_data(max_entries=8, show_spinner=False))
+def keyword_distribution(token, prev_token, edges, _cube, _cube_prev):
+    curr = bucket_counts(_cube.rows, edges)
+    prev = bucket_counts(_cube_prev.rows, edges)
+    return [(int(c), int(p)) for c, p in zip(curr, prev)]
+
+
+@cached("overview.segment_clicks", st.cache_data(max_entries=8, show_spinner=False))
+def segment_clicks(token, prev_token, _cube, _cube_prev):
+    seg_curr = _cube.segments[["segment", "clicks"]].rename(columns={"clicks": "Clicks"})
+    seg_prev = _cube_prev.segments[["segment", "clicks"]].rename(columns={"clicks": "Clicks_prev"})
+    seg = seg_curr.merge(seg_prev, on="segment", how="left").fillna(0)
+    seg["Change"] = pct_change(seg["Clicks"], seg["Clicks_prev"])
+    return seg.sort_values("Clicks", ascending=False)
 
 
 def chart_layout():
@@ -70,24 +106,26 @@ def chart_layout():
     )
 
 
-def render(df_filtered, df_prev_filtered, start_str, end_str, period_days, compare_option="Previous Period"):
+def render(cube, cube_prev, start_str, end_str, period_days, compare_option="Previous Period"):
     st.markdown(f"""
     <div class="page-title">Search <span class="pink">Overview</span></div>
     <div class="page-subtitle">{start_str} &nbsp;→&nbsp; {end_str} &nbsp;·&nbsp; vs {compare_option.lower()}</div>
     """, unsafe_allow_html=True)
 
     # ── SCORECARDS ───────────────────────────────────────────
-    curr_clicks = df_filtered["clicks"].sum()
-    curr_imp = df_filtered["impressions"].sum()
+    curr = totals(cube.segments)
+    curr_clicks = curr["clicks"]
+    curr_imp = curr["impressions"]
     curr_ctr = round(curr_clicks / curr_imp * 100, 2) if curr_imp > 0 else 0
-    curr_pos = round(df_filtered["position"].mean(), 1)
-    curr_kw = df_filtered["query"].nunique()
+    curr_pos = round(curr["position"], 1)
+    curr_kw = len(cube.queries)
 
-    prev_clicks = df_prev_filtered["clicks"].sum()
-    prev_imp = df_prev_filtered["impressions"].sum()
+    prev = totals(cube_prev.segments)
+    prev_clicks = prev["clicks"]
+    prev_imp = prev["impressions"]
     prev_ctr = round(prev_clicks / prev_imp * 100, 2) if prev_imp > 0 else 0
-    prev_pos = round(df_prev_filtered["position"].mean(), 1)
-    prev_kw = df_prev_filtered["query"].nunique()
+    prev_pos = round(prev["position"], 1)
+    prev_kw = len(cube_prev.queries)
 
     c1, c2, c3, c4, c5 = st.columns(5)
     with c1: scorecard("Total Clicks", curr_clicks, prev_clicks)
@@ -112,9 +150,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days, compa
     with ctrl2:
         granularity = st.selectbox("Granularity", ["Day", "Week", "Month"], index=1, key="overview_gran")
 
-    agg = get_period_data(df_filtered, granularity)
-    agg["CTR"] = agg["CTR"].round(2)
-    agg["Position"] = agg["Position"].round(1)
+    agg = performance_series(cube.token, granularity, cube)
 
     METRIC_COLORS = {
         "Clicks": "#FF2D78",
@@ -184,33 +220,21 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days, compa
     # ── KEYWORD DISTRIBUTION ─────────────────────────────────
     st.markdown('<div class="section-header">Keyword Distribution Across Search Pages</div>', unsafe_allow_html=True)
 
-    def kw_bucket(df, low, high):
-        return df[(df["position"] >= low) & (df["position"] <= high)]["query"].nunique()
-
-    buckets = [
-        ("Top 3", "#1–3", 1, 3),
-        ("Top 10", "#4–10", 4, 10),
-        ("Top 20", "#11–20", 11, 20),
-        ("Rest", "#21+", 21, 999),
-    ]
-
     b1, b2, b3, b4 = st.columns(4)
     bucket_cols = [b1, b2, b3, b4]
+    edges = tuple((low, high) for _, _, low, high in BUCKETS)
+    counts = keyword_distribution(cube.token, cube_prev.token, edges, cube, cube_prev)
 
-    for col, (label, range_label, low, high) in zip(bucket_cols, buckets):
-        curr_count = kw_bucket(df_filtered, low, high)
-        prev_count = kw_bucket(df_prev_filtered, low, high)
+    for col, (label, range_label, _, _), (curr_count, prev_count) in zip(bucket_cols, BUCKETS, counts):
         change = calc_change(curr_count, prev_count)
         diff = curr_count - prev_count
         delta_class = "delta-up" if change >= 0 else "delta-down"
-        arrow = "▲" if change >= 0 else "▼"
-        diff_arrow = "▲" if diff >= 0 else "▼"
         with col:
             st.markdown(f"""
             <div class="metric-card">
                 <div class="metric-label">{label} <span style="color:rgba(226,228,236,0.3); font-size:0.6rem;">{range_label}</span></div>
                 <div class="metric-value">{curr_count:,}</div>
-                <div class="metric-delta {delta_class}">{diff_arrow} {abs(diff)} &nbsp;·&nbsp; {arrow} {abs(change)}%</div>
+                <div class="metric-delta {delta_class}">{arrow(diff)} {abs(diff)} &nbsp;·&nbsp; {arrow(change)} {abs(change)}%</div>
                 <div class="metric-prev">prev: {prev_count:,}</div>
             </div>
             """, unsafe_allow_html=True)
@@ -218,11 +242,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days, compa
     # ── SEGMENT BREAKDOWN ────────────────────────────────────
     st.markdown('<div class="section-header">Clicks By Segment</div>', unsafe_allow_html=True)
 
-    seg_curr = df_filtered.groupby("segment").agg(Clicks=("clicks", "sum")).reset_index()
-    seg_prev = df_prev_filtered.groupby("segment").agg(Clicks_prev=("clicks", "sum")).reset_index()
-    seg = seg_curr.merge(seg_prev, on="segment", how="left").fillna(0)
-    seg["Change"] = seg.apply(lambda r: calc_change(r["Clicks"], r["Clicks_prev"]), axis=1)
-    seg = seg.sort_values("Clicks", ascending=False)
+    seg = segment_clicks(cube.token, cube_prev.token, cube, cube_prev)
 
     colors = {
         "Brand (Pure)": "#FF2D78",
@@ -235,19 +255,18 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days, compa
         "Category": "#45B7D1"
     }
 
-    cols = st.columns(len(seg))
+    cols = st.columns(len(seg)) if len(seg) else []
     for i, (_, row) in enumerate(seg.iterrows()):
         with cols[i]:
             color = colors.get(row["segment"], "#555")
             change_color = "#00E096" if row["Change"] >= 0 else "#FF4D6D"
-            arrow = "▲" if row["Change"] >= 0 else "▼"
             st.markdown(f"""
             <div class="seg-chip" style="border-top: 2px solid {color};">
                 <div class="seg-chip-name">{row['segment']}</div>
                 <div class="seg-chip-value">{int(row['Clicks']):,}</div>
                 <div style="font-size:0.65rem; color:rgba(226,228,236,0.9); margin-bottom:4px; letter-spacing:1px; text-transform:uppercase;">clicks</div>
                 <div class="seg-chip-delta" style="color:{change_color};">
-                    {arrow} {abs(row['Change'])}%
+                    {arrow(row['Change'])} {abs(row['Change'])}%
                 </div>
             </div>
             """, unsafe_allow_html=True)
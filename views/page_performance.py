@@ -1,6 +1,11 @@
 import streamlit as st
 import plotly.graph_objects as go
 import re
+from functools import lru_cache
+from utils.cube import period_rollup, rollup, totals
+from utils.deltas import arrow, calc_change, pct_change
+from utils.matcher import AhoCorasick
+from utils.telemetry import cached, track_lru
 
 # ── PAGE TYPE CLASSIFIER ─────────────────────────────────────
 
@@ -130,57 +135,127 @@ UK_LOCATIONS = {
 }
 
 
+_DOMAIN = re.compile(r"https?://[^/]+")
+
+# One automaton for every substring rule: the near-me store path and all category slugs.
+_PATH_MATCHER = AhoCorasick({
+    "sex-shops-near-me": {"near_me"},
+    **{cat_slug: {"category"} for cat_slug in CATEGORY_SLUGS},
+})
+
+
+def is_location_part(part):
+    """True if the path part is a UK location, or starts with one followed by a hyphen."""
+    if part in UK_LOCATIONS:
+        return True
+    hyphen = part.find("-")
+    while hyphen != -1:
+        if part[:hyphen] in UK_LOCATIONS:
+            return True
+        hyphen = part.find("-", hyphen + 1)
+    return False
+
+
+# Landing pages repeat across reruns and periods, so each URL is only classified once.
+@lru_cache(maxsize=50_000)
 def classify_page(url):
     if not isinstance(url, str):
         return "Unclassified"
     path = url.lower()
     # Remove domain if present
-    path = re.sub(r"https?://[^/]+", "", path)
+    path = _DOMAIN.sub("", path)
     # Remove trailing slash and query params
     path = path.split("?")[0].rstrip("/")
-    slug = path.strip("/").split("/")[-1] if "/" in path else path.strip("/")
 
     if path in ("", "/"):
         return "Homepage"
-    if "sex-shops-near-me" in path:
+    matched = _PATH_MATCHER.labels(path)
+    if "near_me" in matched:
         return "Store Page"
     path_parts = path.strip("/").split("/")
-    for loc in UK_LOCATIONS:
-        if any(part == loc or part.startswith(loc + "-") for part in path_parts):
-            return "Store Page"
-    if slug in CATEGORY_SLUGS:
+    if any(is_location_part(part) for part in path_parts):
+        return "Store Page"
+    # An exact slug match is also a substring match, so one check covers both rules
+    if "category" in matched:
         return "Category Page"
-    for cat_slug in CATEGORY_SLUGS:
-        if cat_slug in path:
-            return "Category Page"
-    # Products — if URL has multiple path segments and doesn't match above
-    segments = [s for s in path.strip("/").split("/") if s]
-    if len(segments) >= 2:
-        return "Product Page"
-    if len(segments) == 1:
+    # Products — any remaining URL with at least one path segment
+    if any(path_parts):
         return "Product Page"
 
     return "Unclassified"
 
 
-def get_period_data(df, granularity):
-    df = df.copy()
-    if granularity == "Day":
-        df["period"] = df["date"]
-    elif granularity == "Week":
-        df["period"] = df["date"].dt.to_period("W").dt.start_time
-    else:
-        df["period"] = df["date"].dt.to_period("M").dt.start_time
-    return df.groupby("period").agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-    ).reset_index()
+# Extract slug for display
+@lru_cache(maxsize=50_000)
+def to_slug(url):
+    if not isinstance(url, str):
+        return url
+    path = _DOMAIN.sub("", url).split("?")[0].rstrip("/")
+    return path if path else "/"
+
+
+track_lru("page_performance.classify_page", classify_page)
+track_lru("page_performance.to_slug", to_slug)
 
 
-def calc_change(curr, prev):
-    if prev == 0:
-        return 100.0
-    return round(((curr - prev) / prev) * 100, 1)
+# ── MEMOISED VIEW COMPUTATIONS ───────────────────────────────
+# Keyed on the cube tokens; the underscore-prefixed cubes are never hashed.
+
+@cached("page_performance.labelled_pages", st.cache_data(max_entries=8, show_spinner=False))
+def labelled_pages(token, _cube):
+    """The page rollup with page_type and slug; each unique URL is classified once."""
+    urls = _cube.pages["page"].astype(object)
+    return _cube.pages.assign(page_type=urls.map(classify_page), slug=urls.map(to_slug))
+
+
+def pages_of_type(pages_df, selected_type):
+    if selected_type == "All":
+        return pages_df
+    return pages_df[pages_df["page_type"] == selected_type]
+
+
+@cached("page_performance.top_pages", st.cache_data(max_entries=16, show_spinner=False))
+def top_pages(token, prev_token, selected_type, _cube, _cube_prev):
+    pages_view = pages_of_type(labelled_pages(token, _cube), selected_type)
+    pages_prev_view = pages_of_type(labelled_pages(prev_token, _cube_prev), selected_type)
+    pages_curr = rollup(pages_view, ["slug", "page_type"]).rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "ctr": "CTR", "position": "Position"
+    })[["slug", "page_type", "Clicks", "Impressions", "CTR", "Position"]]
+    pages_prev = rollup(pages_prev_view, ["slug"]).rename(
+        columns={"clicks": "Clicks_prev"}
+    )[["slug", "Clicks_prev"]]
+    pages = pages_curr.merge(pages_prev, on="slug", how="left").fillna(0)
+    pages["Change %"] = pct_change(pages["Clicks"], pages["Clicks_prev"])
+    pages["CTR"] = pages["CTR"].round(2)
+    pages["Position"] = pages["Position"].round(1)
+    pages = pages.sort_values("Clicks", ascending=False)
+    pages.columns = ["URL", "Type", "Clicks", "Impressions", "CTR %", "Position", "Clicks (Prev)", "Change %"]
+    return pages
+
+
+def pages_with_slug(token, _cube, slug):
+    pages_df = labelled_pages(token, _cube)
+    return pages_df.loc[pages_df["slug"] == slug, "page"]
+
+
+@cached("page_performance.page_trend", st.cache_data(max_entries=32, show_spinner=False))
+def page_trend(token, slug, granularity, _cube):
+    df_url = _cube.page_days[_cube.page_days["page"].isin(pages_with_slug(token, _cube, slug))]
+    if df_url.empty:
+        return None
+    return period_rollup(df_url, granularity)
+
+
+@cached("page_performance.top_page_queries", st.cache_data(max_entries=32, show_spinner=False))
+def top_page_queries(token, slug, _cube):
+    page_queries = rollup(
+        _cube.page_queries[_cube.page_queries["page"].isin(pages_with_slug(token, _cube, slug))], ["query"]
+    ).rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "ctr": "CTR", "position": "Position"
+    })[["query", "Clicks", "Impressions", "CTR", "Position"]].sort_values("Clicks", ascending=False).head(25)
+    page_queries["CTR"] = page_queries["CTR"].round(2)
+    page_queries["Position"] = page_queries["Position"].round(1)
+    return page_queries
 
 
 def chart_layout(height=300):
@@ -215,31 +290,19 @@ def chart_layout(height=300):
     )
 
 
-def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
+def render(cube, cube_prev, start_str, end_str, period_days):
     st.markdown("""
     <div class="page-title">Page <span class="pink">Performance</span></div>
     <div class="page-subtitle">URL-level search performance across your site</div>
     """, unsafe_allow_html=True)
 
     # ── CLASSIFY PAGES ───────────────────────────────────────
-    if "page" not in df_filtered.columns:
+    if "page" not in cube.rows.columns:
         st.warning("No page/URL data available from GSC. Check your data fetch includes the 'page' dimension.")
         return
 
-    df = df_filtered.copy()
-    df_prev = df_prev_filtered.copy()
-    df["page_type"] = df["page"].apply(classify_page)
-    df_prev["page_type"] = df_prev["page"].apply(classify_page)
-
-    # Extract slug for display
-    def to_slug(url):
-        if not isinstance(url, str):
-            return url
-        path = re.sub(r"https?://[^/]+", "", url).split("?")[0].rstrip("/")
-        return path if path else "/"
-
-    df["slug"] = df["page"].apply(to_slug)
-    df_prev["slug"] = df_prev["page"].apply(to_slug)
+    pages_df = labelled_pages(cube.token, cube)
+    pages_prev_df = labelled_pages(cube_prev.token, cube_prev)
 
     # ── PAGE TYPE FILTER BUTTONS ──────────────────────────────
     PAGE_TYPES = ["All", "Category Page", "Store Page", "Product Page", "Homepage", "Unclassified"]
@@ -266,32 +329,29 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
 
     # ── FILTER BY TYPE ────────────────────────────────────────
     selected_type = st.session_state.selected_page_type
-    if selected_type != "All":
-        df_view = df[df["page_type"] == selected_type]
-        df_prev_view = df_prev[df_prev["page_type"] == selected_type]
-    else:
-        df_view = df
-        df_prev_view = df_prev
+    pages_view = pages_of_type(pages_df, selected_type)
+    pages_prev_view = pages_of_type(pages_prev_df, selected_type)
 
     # ── SUMMARY CARDS ─────────────────────────────────────────
-    curr_clicks = df_view["clicks"].sum()
-    curr_imp = df_view["impressions"].sum()
-    curr_pages = df_view["page"].nunique()
-    curr_pos = round(df_view["position"].mean(), 1)
-    prev_clicks = df_prev_view["clicks"].sum()
-    prev_imp = df_prev_view["impressions"].sum()
-    prev_pages = df_prev_view["page"].nunique()
-    prev_pos = round(df_prev_view["position"].mean(), 1)
+    curr = totals(pages_view)
+    prev = totals(pages_prev_view)
+    curr_clicks = curr["clicks"]
+    curr_imp = curr["impressions"]
+    curr_pages = len(pages_view)
+    curr_pos = round(curr["position"], 1)
+    prev_clicks = prev["clicks"]
+    prev_imp = prev["impressions"]
+    prev_pages = len(pages_prev_view)
+    prev_pos = round(prev["position"], 1)
 
     def scorecard(label, value, prev_value, format_fn=lambda x: f"{x:,}"):
         change = calc_change(value, prev_value)
         delta_class = "delta-up" if change >= 0 else "delta-down"
-        arrow = "▲" if change >= 0 else "▼"
         st.markdown(f"""
         <div class="metric-card">
             <div class="metric-label">{label}</div>
             <div class="metric-value">{format_fn(value)}</div>
-            <div class="metric-delta {delta_class}">{arrow} {abs(change)}% vs prev</div>
+            <div class="metric-delta {delta_class}">{arrow(change)} {abs(change)}% vs prev</div>
             <div class="metric-prev">prev: {format_fn(prev_value)}</div>
         </div>
         """, unsafe_allow_html=True)
@@ -307,21 +367,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
     # ── TOP PAGES TABLE ───────────────────────────────────────
     st.markdown('<div class="section-header">Top Pages</div>', unsafe_allow_html=True)
 
-    pages_curr = df_view.groupby(["slug", "page_type"]).agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-        CTR=("ctr", "mean"),
-        Position=("position", "mean")
-    ).reset_index()
-    pages_prev = df_prev_view.groupby("slug").agg(
-        Clicks_prev=("clicks", "sum")
-    ).reset_index()
-    pages = pages_curr.merge(pages_prev, on="slug", how="left").fillna(0)
-    pages["Change %"] = pages.apply(lambda r: calc_change(r["Clicks"], r["Clicks_prev"]), axis=1)
-    pages["CTR"] = pages["CTR"].round(2)
-    pages["Position"] = pages["Position"].round(1)
-    pages = pages.sort_values("Clicks", ascending=False)
-    pages.columns = ["URL", "Type", "Clicks", "Impressions", "CTR %", "Position", "Clicks (Prev)", "Change %"]
+    pages = top_pages(cube.token, cube_prev.token, selected_type, cube, cube_prev)
 
     st.dataframe(pages, use_container_width=True, hide_index=True)
 
@@ -357,9 +403,8 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
     selected_url = st.selectbox("Select a page to view trend", url_options, key="page_trend_url")
     granularity = st.selectbox("Granularity", ["Day", "Week", "Month"], index=1, key="page_trend_gran")
 
-    df_url = df_view[df_view["slug"] == selected_url]
-    if not df_url.empty:
-        agg = get_period_data(df_url, granularity)
+    agg = page_trend(cube.token, selected_url, granularity, cube)
+    if agg is not None:
         fig2 = go.Figure()
         fig2.add_trace(go.Scatter(
             x=agg["period"], y=agg["Clicks"],
@@ -387,12 +432,5 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
     # ── TOP QUERIES FOR SELECTED PAGE ────────────────────────
     st.markdown(f'<div class="section-header">Queries driving {selected_url}</div>', unsafe_allow_html=True)
 
-    page_queries = df_view[df_view["slug"] == selected_url].groupby("query").agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-        CTR=("ctr", "mean"),
-        Position=("position", "mean")
-    ).reset_index().sort_values("Clicks", ascending=False).head(25)
-    page_queries["CTR"] = page_queries["CTR"].round(2)
-    page_queries["Position"] = page_queries["Position"].round(1)
+    page_queries = top_page_queries(cube.token, selected_url, cube)
     st.dataframe(page_queries, use_container_width=True, hide_index=True)
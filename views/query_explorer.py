@@ -1,7 +1,21 @@
 import streamlit as st
+from utils.telemetry import cached
 
 
-def render(df_filtered, start_str, end_str):
+@cached("query_explorer.explorer_table", st.cache_data(max_entries=8, show_spinner=False))
+def explorer_table(token, _cube):
+    """The unfiltered explorer table, sorted by clicks, so the filter widgets only slice it."""
+    explorer_df = _cube.queries[_cube.queries["store"].notna()][
+        ["query", "segment", "store", "clicks", "impressions", "ctr", "position"]
+    ].rename(columns={
+        "clicks": "Clicks", "impressions": "Impressions", "ctr": "CTR", "position": "Position"
+    })
+    explorer_df["CTR"] = explorer_df["CTR"].round(2)
+    explorer_df["Position"] = explorer_df["Position"].round(1)
+    return explorer_df.sort_values("Clicks", ascending=False, kind="stable")
+
+
+def render(cube, start_str, end_str):
     st.markdown("""
     <div class="page-title">Query <span class="pink">Explorer</span></div>
     <div class="page-subtitle">Filter, sort and explore every keyword</div>
@@ -17,14 +31,7 @@ def render(df_filtered, start_str, end_str):
 
     pos_range = st.slider("Position range", min_value=1.0, max_value=100.0, value=(1.0, 100.0))
 
-    explorer_df = df_filtered.groupby(["query", "segment", "store"]).agg(
-        Clicks=("clicks", "sum"),
-        Impressions=("impressions", "sum"),
-        CTR=("ctr", "mean"),
-        Position=("position", "mean")
-    ).reset_index()
-    explorer_df["CTR"] = explorer_df["CTR"].round(2)
-    explorer_df["Position"] = explorer_df["Position"].round(1)
+    explorer_df = explorer_table(cube.token, cube)
     explorer_df = explorer_df[explorer_df["Clicks"] >= min_clicks]
     explorer_df = explorer_df[explorer_df["Impressions"] >= min_impressions]
     explorer_df = explorer_df[
@@ -33,7 +40,6 @@ def render(df_filtered, start_str, end_str):
     ]
     if keyword_search:
         explorer_df = explorer_df[explorer_df["query"].str.contains(keyword_search, case=False)]
-    explorer_df = explorer_df.sort_values("Clicks", ascending=False)
     explorer_df.columns = ["Query", "Segment", "Store", "Clicks", "Impressions", "CTR %", "Position"]
 
     st.markdown(f"**{len(explorer_df):,} queries** matching filters")
@@ -1,34 +1,33 @@
 import streamlit as st
+from utils.deltas import change_labels, pct_change
+from utils.telemetry import cached
 
 
-def calc_change(curr, prev):
-    if prev == 0:
-        return 100.0
-    return round(((curr - prev) / prev) * 100, 1)
+@cached("winners_losers.compare_queries", st.cache_data(max_entries=8, show_spinner=False))
+def compare_queries(token, prev_token, _cube, _cube_prev):
+    """Per-query current vs previous metrics, memoised on the cube tokens."""
+    curr_q = _cube.queries[["query", "segment", "clicks", "impressions", "position"]]
+    prev_q = _cube_prev.queries[["query", "clicks", "position"]].rename(
+        columns={"clicks": "clicks_prev", "position": "position_prev"}
+    )
+    merged = curr_q.merge(prev_q, on="query", how="outer")
+    metric_cols = ["clicks", "impressions", "position", "clicks_prev", "position_prev"]
+    merged[metric_cols] = merged[metric_cols].fillna(0)
+    merged["click_change"] = merged["clicks"] - merged["clicks_prev"]
+    merged["click_change_pct"] = pct_change(merged["clicks"], merged["clicks_prev"])
+    merged["pos_change"] = (merged["position_prev"] - merged["position"]).round(1)
+    merged["position"] = merged["position"].round(1)
+    return merged
 
 
-def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
+def render(cube, cube_prev, start_str, end_str, period_days):
     st.markdown("""
     <div class="page-title">Winners <span class="pink">&amp; Losers</span></div>
     """, unsafe_allow_html=True)
     st.markdown(f'<div class="page-subtitle">{start_str} → {end_str} &nbsp;·&nbsp; vs previous {period_days} days</div>', unsafe_allow_html=True)
 
-    curr_q = df_filtered.groupby(["query", "segment"]).agg(
-        clicks=("clicks", "sum"),
-        impressions=("impressions", "sum"),
-        position=("position", "mean")
-    ).reset_index()
-    prev_q = df_prev_filtered.groupby("query").agg(
-        clicks_prev=("clicks", "sum"),
-        position_prev=("position", "mean")
-    ).reset_index()
-    merged = curr_q.merge(prev_q, on="query", how="outer").fillna(0)
-    merged["click_change"] = merged["clicks"] - merged["clicks_prev"]
-    merged["click_change_pct"] = merged.apply(
-        lambda r: calc_change(r["clicks"], r["clicks_prev"]), axis=1
-    )
-    merged["pos_change"] = (merged["position_prev"] - merged["position"]).round(1)
-    merged["position"] = merged["position"].round(1)
+    curr_q = cube.queries[["query", "segment", "clicks", "impressions", "position"]]
+    merged = compare_queries(cube.token, cube_prev.token, cube, cube_prev)
 
     tab1, tab2, tab3, tab4 = st.tabs([
         "Click Winners", "Click Losers",
@@ -41,7 +40,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
             ["query", "segment", "clicks", "clicks_prev", "click_change", "click_change_pct", "position"]
         ].copy()
         winners.columns = ["Query", "Segment", "Clicks", "Clicks (Prev)", "Change", "Change %", "Position"]
-        winners["Change %"] = winners["Change %"].apply(lambda x: f"▲ {abs(x)}%")
+        winners["Change %"] = change_labels(winners["Change %"], "▲")
         st.dataframe(winners, use_container_width=True, hide_index=True)
         
 
@@ -51,7 +50,7 @@ def render(df_filtered, df_prev_filtered, start_str, end_str, period_days):
             ["query", "segment", "clicks", "clicks_prev", "click_change", "click_change_pct", "position"]
         ].copy()
         losers.columns = ["Query", "Segment", "Clicks", "Clicks (Prev)", "Change", "Change %", "Position"]
-        losers["Change %"] = losers["Change %"].apply(lambda x: f"▼ {abs(x)}%")
+        losers["Change %"] = change_labels(losers["Change %"], "▼")
         st.dataframe(losers, use_container_width=True, hide_index=True)
         
 